@@ -0,0 +1,148 @@
+"""Admission control shared by all gunicorn workers on a host.
+
+Token buckets live in a small SQLite database under ADMISSION_DIR, so a client
+hitting several workers still draws from one bucket. A limit is written as
+``<count>/<period>`` (``'5/hour'``): up to ``count`` requests in a burst,
+refilled at ``count`` per period. An empty or ``0`` limit disables it.
+
+SlotPool caps how many holders run at once across processes with one flock'd
+file per slot; the kernel releases a slot if its holder dies.
+"""
+import contextlib
+import fcntl
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import namedtuple
+
+import blocking
+
+ADMISSION_DIR = os.environ.get('ADMISSION_DIR', os.path.join(tempfile.gettempdir(), 'survey_admission'))
+# Expired buckets are deleted at most this often (seconds).
+PRUNE_INTERVAL = 60
+# Seconds a request waits for another worker's bucket update before it is admitted anyway.
+LOCK_TIMEOUT = 0.5
+PERIODS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+
+Limit = namedtuple('Limit', 'burst period')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS buckets (
+    key TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    updated REAL NOT NULL,
+    full_at REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS buckets_full_at ON buckets (full_at);
+"""
+
+_local = threading.local()
+_last_prune = 0.0
+
+
+def parse_limit(spec):
+    """Parses ``'<count>/<second|minute|hour|day>'`` into a Limit, or None when disabled."""
+    if not spec or spec.strip() == '0':
+        return None
+    count, _, period = spec.strip().partition('/')
+    if period not in PERIODS or int(count) < 1:
+        raise ValueError(f"Invalid rate limit {spec!r}, expected e.g. '5/hour'")
+    return Limit(int(count), PERIODS[period])
+
+
+def _db():
+    conn = getattr(_local, 'conn', None)
+    if conn is None or _local.pid != os.getpid():
+        os.makedirs(ADMISSION_DIR, exist_ok=True)
+        conn = sqlite3.connect(os.path.join(ADMISSION_DIR, 'buckets.db'), timeout=LOCK_TIMEOUT,
+                               isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=OFF')
+        conn.executescript(_SCHEMA)
+        _local.conn = conn
+        _local.pid = os.getpid()
+    return conn
+
+
+def take(*buckets, now=None):
+    """Takes one token from every ``(key, limit)`` bucket, or from none of them.
+
+    Returns 0 when the request is admitted, otherwise the seconds until it
+    would be. Fails open: if the database is unavailable the request is admitted.
+    """
+    buckets = [(key, limit) for key, limit in buckets if limit is not None]
+    if not buckets:
+        return 0.0
+    # waiting for another worker's write lock blocks in SQLite, off the event loop under gevent
+    return blocking.call(_take, buckets, time.time() if now is None else now)
+
+
+def _take(buckets, now):
+    global _last_prune
+    try:
+        conn = _db()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            retry_after = 0.0
+            updates = []
+            for key, limit in buckets:
+                rate = limit.burst / limit.period
+                row = conn.execute('SELECT tokens, updated FROM buckets WHERE key = ?', (key,)).fetchone()
+                tokens = limit.burst if row is None else min(limit.burst, row[0] + (now - row[1]) * rate)
+                if tokens < 1:
+                    retry_after = max(retry_after, (1 - tokens) / rate)
+                updates.append((key, tokens - 1, now, now + (limit.burst - tokens + 1) / rate))
+            if not retry_after:
+                conn.executemany('INSERT OR REPLACE INTO buckets (key, tokens, updated, full_at) VALUES (?, ?, ?, ?)',
+                                 updates)
+            if now - _last_prune > PRUNE_INTERVAL:
+                conn.execute('DELETE FROM buckets WHERE full_at < ?', (now,))
+                _last_prune = now
+            conn.execute('COMMIT')
+        except sqlite3.Error:
+            conn.execute('ROLLBACK')
+            raise
+    except (sqlite3.Error, OSError) as e:
+        print(f"Error checking rate limits: {e}")
+        return 0.0
+    return retry_after
+
+
+class SlotPool:
+    """At most ``size`` concurrent holders across all processes; ``size`` 0 means unlimited."""
+
+    def __init__(self, name, size, poll_interval=0.05):
+        self.name = name
+        self.size = size
+        self.poll_interval = poll_interval
+
+    def _try_acquire(self):
+        os.makedirs(ADMISSION_DIR, exist_ok=True)
+        for slot in range(self.size):
+            fd = os.open(os.path.join(ADMISSION_DIR, f'{self.name}.{slot}.lock'), os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                os.close(fd)
+                continue
+            return fd
+        return None
+
+    @contextlib.contextmanager
+    def hold(self, timeout=None):
+        """Waits up to ``timeout`` seconds (forever if None) for a slot; yields False if none came free."""
+        if self.size <= 0:
+            yield True
+            return
+        deadline = None if timeout is None else time.monotonic() + timeout
+        fd = self._try_acquire()
+        while fd is None and (deadline is None or time.monotonic() < deadline):
+            time.sleep(self.poll_interval)
+            fd = self._try_acquire()
+        try:
+            yield fd is not None
+        finally:
+            if fd is not None:
+                os.close(fd)
@@ -0,0 +1,204 @@
+"""Pre-aggregated statistics over submitted assessments.
+
+Counters are kept in a small SQLite table and bumped for every batch of
+records the results store commits, once per time bucket (day, month, all
+time) and language. A dashboard query reads a handful of counter rows per
+period, so its cost does not depend on how many submissions exist.
+
+If the database is lost it can be rebuilt from the results log:
+
+    python analytics.py rebuild
+"""
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import Counter
+
+import results_store
+
+ANALYTICS_PATH = os.environ.get('ANALYTICS_PATH', 'analytics.db')
+BUCKETS = ('day', 'month', 'all')
+# Number of periods returned when the caller does not give a range.
+DEFAULT_PERIODS = {'day': 30, 'month': 12, 'all': 1}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS aggregates (
+    bucket TEXT NOT NULL,
+    period TEXT NOT NULL,
+    lang TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value INTEGER NOT NULL,
+    PRIMARY KEY (bucket, period, lang, metric, key)
+) WITHOUT ROWID;
+"""
+
+_local = threading.local()
+
+
+def _db(path=None):
+    path = path or ANALYTICS_PATH
+    conns = getattr(_local, 'conns', None)
+    if conns is None or _local.pid != os.getpid():
+        conns = _local.conns = {}
+        _local.pid = os.getpid()
+    conn = conns.get(path)
+    if conn is None:
+        conn = sqlite3.connect(path, timeout=30)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.executescript(_SCHEMA)
+        conns[path] = conn
+    return conn
+
+
+def period_of(bucket, timestamp):
+    if bucket == 'day':
+        return time.strftime('%Y-%m-%d', time.gmtime(timestamp))
+    if bucket == 'month':
+        return time.strftime('%Y-%m', time.gmtime(timestamp))
+    return ''
+
+
+def _increments(records, survey_for):
+    """Folds unpacked result records into ``{(bucket, period, lang, metric, key): delta}``."""
+    deltas = Counter()
+    for timestamp, state, level_scores, final_level, lang, version in records:
+        survey = survey_for(version)
+        if survey is None or final_level >= len(survey.levels):
+            continue  # survey version no longer deployed, or a record that does not fit it
+        lang = lang or 'other'
+        picks = survey.unpack(state)
+        for bucket in BUCKETS:
+            prefix = (bucket, period_of(bucket, timestamp), lang)
+            deltas[prefix + ('completed', '')] += 1
+            deltas[prefix + ('final_level', survey.level_names[final_level])] += 1
+            for level_name, points in zip(survey.level_names, level_scores):
+                deltas[prefix + ('points', level_name)] += points
+            for key, letter in picks.items():
+                deltas[prefix + ('pick', f'{key}={letter}')] += 1
+    return deltas
+
+
+def apply(records, survey_for, path=None):
+    """Adds a batch of committed result records to the aggregates in one transaction.
+
+    ``survey_for(version)`` returns the compiled survey a record was taken with.
+    """
+    conn = _db(path)
+    with conn:
+        _add(conn, records, survey_for)
+
+
+def _add(conn, records, survey_for):
+    """Adds records to the aggregates inside the caller's transaction."""
+    deltas = _increments(records, survey_for)
+    if deltas:
+        conn.executemany(
+            'INSERT INTO aggregates (bucket, period, lang, metric, key, value) VALUES (?, ?, ?, ?, ?, ?) '
+            'ON CONFLICT (bucket, period, lang, metric, key) DO UPDATE SET value = value + excluded.value',
+            [key + (value,) for key, value in deltas.items()])
+
+
+def _default_start(bucket):
+    now = time.time()
+    if bucket == 'day':
+        return period_of('day', now - (DEFAULT_PERIODS['day'] - 1) * 86400)
+    if bucket == 'month':
+        year, month = time.gmtime(now)[:2]
+        months = year * 12 + month - DEFAULT_PERIODS['month']
+        return f'{months // 12:04d}-{months % 12 + 1:02d}'
+    return ''
+
+
+def query(bucket='day', start=None, end=None, lang=None, metrics=None, path=None):
+    """Returns ``{period: {metric: {key: value}}}`` for the periods in [start, end].
+
+    ``start`` and ``end`` are period strings (``YYYY-MM-DD`` or ``YYYY-MM``);
+    by default the most recent DEFAULT_PERIODS[bucket] periods are returned.
+    Counters of all languages are summed unless ``lang`` is given.
+    """
+    if bucket not in BUCKETS:
+        raise ValueError(f"Unknown bucket {bucket!r}")
+    end = end or period_of(bucket, time.time())
+    start = start or _default_start(bucket)
+    sql = 'SELECT period, metric, key, SUM(value) FROM aggregates WHERE bucket = ? AND period BETWEEN ? AND ?'
+    params = [bucket, start, end]
+    if lang:
+        sql += ' AND lang = ?'
+        params.append(lang)
+    if metrics:
+        sql += f" AND metric IN ({', '.join('?' * len(metrics))})"
+        params.extend(metrics)
+    sql += ' GROUP BY period, metric, key ORDER BY period'
+
+    result = {}
+    for period, metric, key, value in _db(path).execute(sql, params):
+        result.setdefault(period, {}).setdefault(metric, {})[key] = value
+    return result
+
+
+def level_distribution(bucket='day', start=None, end=None, lang=None):
+    """Completed assessments per final level, per period."""
+    rows = query(bucket, start, end, lang, ('completed', 'final_level'))
+    return {period: {'completed': data.get('completed', {}).get('', 0),
+                     'final_level': data.get('final_level', {})}
+            for period, data in rows.items()}
+
+
+def mean_scores(bucket='day', start=None, end=None, lang=None):
+    """Mean points per survey level, per period."""
+    rows = query(bucket, start, end, lang, ('completed', 'points'))
+    result = {}
+    for period, data in rows.items():
+        completed = data.get('completed', {}).get('', 0)
+        result[period] = {'completed': completed,
+                          'mean_points': {level: round(points / completed, 3) if completed else 0.0
+                                          for level, points in data.get('points', {}).items()}}
+    return result
+
+
+def pick_rates(bucket='day', start=None, end=None, lang=None):
+    """Share of respondents choosing each option, per question and period."""
+    rows = query(bucket, start, end, lang, ('completed', 'pick'))
+    result = {}
+    for period, data in rows.items():
+        completed = data.get('completed', {}).get('', 0)
+        questions = {}
+        for pick, count in data.get('pick', {}).items():
+            key, _, letter = pick.partition('=')
+            questions.setdefault(key, {})[letter] = round(count / completed, 4) if completed else 0.0
+        result[period] = {'completed': completed, 'questions': questions}
+    return result
+
+
+def rebuild(results_path, survey_for, path=None, batch_size=10000):
+    """Recomputes every aggregate from a results log.
+
+    Runs as one transaction, so if the log is missing or unreadable the
+    previous aggregates are kept and the error is raised.
+    """
+    conn = _db(path)
+    with conn:
+        conn.execute('DELETE FROM aggregates')
+        batch = []
+        for record in results_store.iter_records(results_path):
+            batch.append(record)
+            if len(batch) == batch_size:
+                _add(conn, batch, survey_for)
+                batch = []
+        _add(conn, batch, survey_for)
+
+
+if __name__ == '__main__':
+    if sys.argv[1:] != ['rebuild']:
+        sys.exit("usage: python analytics.py rebuild")
+    from app import surveys
+
+    try:
+        rebuild(results_store.RESULTS_PATH, surveys.by_id)
+    except (OSError, ValueError) as e:
+        sys.exit(f"Error rebuilding {ANALYTICS_PATH}, it was left unchanged: {e}")
+    print(f"Rebuilt {ANALYTICS_PATH} from {results_store.RESULTS_PATH}")
@@ -0,0 +1,37 @@
+"""URL tokens for packed answer states.
+
+A state (see survey_model) is written as a short hex string, prefixed with
+``<version id>-`` for any survey version but the first. When the app has a
+secret key the token is signed with it, so a tampered token is rejected and
+treated as an empty survey.
+"""
+from itsdangerous import BadSignature, Signer
+
+SALT = 'survey-answers'
+
+
+def encode_state(state, secret_key=None, version_id=0):
+    """Returns the URL token for ``state`` of survey version ``version_id``."""
+    token = format(state, 'x')
+    if version_id:
+        token = f'{version_id}-{token}'
+    if secret_key:
+        token = Signer(secret_key, salt=SALT).sign(token).decode('ascii')
+    return token
+
+
+def decode_state(token, secret_key=None):
+    """Returns ``(version id, state)`` stored in ``token``, or ``(None, 0)`` if it is missing or invalid."""
+    if not token:
+        return None, 0
+    try:
+        if secret_key:
+            token = Signer(secret_key, salt=SALT).unsign(token).decode('ascii')
+        version, _, token = token.rpartition('-')
+        version_id = int(version) if version else 0
+        state = int(token, 16)
+    except (BadSignature, ValueError):
+        return None, 0
+    if state < 0 or version_id < 0:
+        return None, 0
+    return version_id, state
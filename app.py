@@ -1,297 +1,243 @@
+import json
+import math
+import mimetypes
 import os
-import smtplib
-from email.mime.text import MIMEText
-from flask import Flask, render_template, request, redirect, url_for
+import time
+from functools import lru_cache
+from flask import Flask, render_template, request, redirect, url_for, g, jsonify, send_from_directory
 from dotenv import load_dotenv
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+import admission
+import analytics
+import assets
+import blocking
+import mailer
+import metrics
+import results_store
+import survey_loader
+from answer_state import decode_state, encode_state
+from render_cache import STATE_PLACEHOLDER, RenderCache
+from survey_loader import SurveyRegistry
 
 # Load variables from .env file (local development only)
 load_dotenv()
 
 app = Flask(__name__)
 app.secret_key = os.environ.get('SECRET_KEY')
+# Number of reverse proxies in front of the app whose X-Forwarded-For can be trusted for the client IP.
+# The rate limits are per client IP, so behind a router (the Procfile sets 1) this must not be 0,
+# or every visitor shares the router's buckets.
+PROXY_COUNT = int(os.environ.get('PROXY_COUNT', 0))
+if PROXY_COUNT:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=PROXY_COUNT)
+_warned_proxy = False
+
+# Rendered survey, final and email pages, keyed by the few inputs they depend on.
+render_cache = RenderCache(os.path.join(app.root_path, app.template_folder),
+                           maxsize=int(os.environ.get('RENDER_CACHE_SIZE', 1024)))
+
+
+def _render_cache_samples():
+    stats = render_cache.stats()
+    return [('survey_render_cache_hits_total', {}, stats['hits']),
+            ('survey_render_cache_misses_total', {}, stats['misses']),
+            ('survey_render_cache_entries', {}, stats['size'])]
+
+
+metrics.register_collector(_render_cache_samples)
+
+# Fingerprinted logo variants and minified CSS. They are built once by gunicorn's on_starting hook
+# (or `python assets.py` as a release step); workers and scripts importing the app only read the manifest.
+ASSET_MANIFEST = assets.load_manifest(app.static_folder)
+
+
+def asset_url(name, fallback=None):
+    """URL of the fingerprinted build of ``name``, or of the plain static file if it was not built."""
+    hashed = ASSET_MANIFEST.get(name)
+    if hashed is not None:
+        return url_for('asset', filename=hashed)
+    return url_for('static', filename=fallback or name)
+
+
+app.jinja_env.globals.update(asset_url=asset_url, has_asset=ASSET_MANIFEST.__contains__)
 
 # --- SMTP Configuration ---
-# The SMTP configuration is now read directly from environment variables and used in the send_email_via_smtp function.
-# No need for Flask-Mail app.config settings.
-
-# The survey questions and choices
-QUESTIONS = {
-    "Minimal": {
-        "level_en": "Minimal",
-        "level_ar": "أساسي",
-        "questions": [
-            {"q": "What is the primary function of your AI-driven customer-facing tool?",
-             "q_ar": "ما هي الوظيفة الأساسية لأداة الذكاء الاصطناعي التي تستخدمها للتواصل مع العملاء؟",
-             "options": ["A. It provides pre-programmed answers to a limited set of FAQs.",
-                         "B. It handles basic queries and can escalate to a human agent.",
-                         "C. It can understand and respond to natural language queries."],
-             "options_ar": ["أ. تقدم إجابات مبرمجة مسبقًا لمجموعة محدودة من الأسئلة الشائعة.",
-                            "ب. تتعامل مع الاستفسارات الأساسية ويمكنها تصعيدها إلى وكيل بشري.",
-                            "ج. يمكنها فهم لغة البشر الطبيعية والاستجابة لها."]},
-            {"q": "How is your AI tool's knowledge base updated?",
-             "q_ar": "كيف يتم تحديث قاعدة بيانات أداة الذكاء الاصطناعي لديك؟",
-             "options": ["A. Manually by a human team adding new rules and responses.",
-                         "B. It uses a simple keyword or phrase-matching system.",
-                         "C. It is integrated with a broader knowledge base or LLM."],
-             "options_ar": ["أ. يتم يدويا عبر فريق بشري يضيف قواعد واستجابات جديدة.",
-                            "ب. تستخدم نظاما بسيطا لمطابقة الكلمات المفتاحية أو العبارات.",
-                            "ج. يتم دمجها مع قاعدة بيانات أوسع أو نماذج لغوية كبيرة."]},
-            {"q": "How does your AI tool handle user input that it doesn't recognize?",
-             "q_ar": "كيف تتعامل أداة الذكاء الاصطناعي مع إدخال المستخدم الذي لا تتعرف عليه؟",
-             "options": ["A. It provides a generic, canned response like 'I don't understand.'",
-                         "B. It searches for the closest keyword match and provides a pre-defined answer.",
-                         "C. It can interpret the intent and redirect the user to a relevant topic."],
-             "options_ar": ["أ. تقدم استجابة عامة ومحفوظة مثل 'لا أفهم'.",
-                            "ب. تبحث عن أقرب تطابق للكلمات المفتاحية وتقدم إجابة محددة مسبقا.",
-                            "ج. يمكنها تفسير القصد وإعادة توجيه المستخدم إلى موضوع ذي صلة."]}
-        ]
-    },
-    "Emerging": {
-        "level_en": "Emerging",
-        "level_ar": "ناشئ",
-        "questions": [
-            {"q": "What is the AI assistant's ability to maintain context within a conversation?",
-             "q_ar": "ما هي قدرة مساعد الذكاء الاصطناعي على الحفاظ على السياق داخل المحادثة؟",
-             "options": ["A. It treats each message as a new query without remembering past interactions.",
-                         "B. It can remember a few key details from the current conversation.",
-                         "C. It retains context across a single conversation session."],
-             "options_ar": ["أ. تتعامل مع كل رسالة كاستفسار جديد دون تذكر التفاعلات السابقة.",
-                            "ب. يمكنها تذكر بعض التفاصيل الرئيسية من المحادثة الحالية.",
-                            "ج. تحتفظ بالسياق عبر جلسة محادثة واحدة."]},
-            {"q": "How does the AI assistant respond to questions it hasn't been trained on?",
-             "q_ar": "كيف يستجيب مساعد الذكاء الاصطناعي للأسئلة التي لم يتم تدريبه عليها؟",
-             "options": ["A. It fails or provides an irrelevant, non-contextual response.",
-                         "B. It escalates the conversation to a human without attempting to answer.",
-                         "C. It can provide a helpful, but potentially unspecific, response using generative AI."],
-             "options_ar": ["أ. تفشل أو تقدم استجابة غير ذات صلة وخارج السياق.",
-                            "ب. تصعّد المحادثة إلى إنسان دون محاولة الإجابة.",
-                            "ج. يمكنها تقديم استجابة مفيدة، ولكنها قد تكون غير محددة، باستخدام الذكاء الاصطناعي التوليدي."]},
-            {"q": "Does the AI assistant have a distinct personality or tone?",
-             "q_ar": "هل لدى مساعد الذكاء الاصطناعي شخصية أو نبرة مميزة؟",
-             "options": ["A. No, responses are generic and robotic.",
-                         "B. Yes, it has been programmed with a consistent brand voice.",
-                         "C. Yes, it can adjust its tone based on the user's sentiment."],
-             "options_ar": ["أ. لا، الإجابات عامة وآلية.", "ب. نعم، لقد تمت برمجتها بنبرة متناسقة مع العلامة التجارية.",
-                            "ج. نعم، يمكنها تعديل نبرتها بناءً على مشاعر المستخدم."]}
-        ]
-    },
-    "Basic": {
-        "level_en": "Basic",
-        "level_ar": "مبتدئ",
-        "questions": [
-            {"q": "Can your AI agent integrate with other systems (e.g., CRM, calendar)?",
-             "q_ar": "هل يمكن لوكيل الذكاء الاصطناعي الخاص بك أن يتكامل مع أنظمة أخرى (مثل CRM أو التقويم)؟",
-             "options": ["A. No, it's a standalone system.",
-                         "B. Yes, through pre-programmed APIs for a limited set of functions.",
-                         "C. Yes, it can use a variety of tools to complete tasks."],
-             "options_ar": ["أ. لا، إنه نظام مستقل.",
-                            "ب. نعم، من خلال واجهات برمجة تطبيقات مبرمجة مسبقًا لمجموعة محدودة من الوظائف.",
-                            "ج. نعم، يمكنه استخدام مجموعة متنوعة من الأدوات لإنجاز المهام."]},
-            {"q": "How does your AI agent handle user-requested actions (e.g., 'book a meeting')?",
-             "q_ar": "كيف يتعامل وكيل الذكاء الاصطناعي مع الإجراءات التي يطلبها المستخدم (مثل 'حجز اجتماع')؟",
-             "options": ["A. It can't perform actions; it only provides information.",
-                         "B. It can perform simple actions after explicit user confirmation.",
-                         "C. It can perform multi-step actions based on user intent."],
-             "options_ar": ["أ. لا يمكنه أداء الإجراءات؛ إنه يوفر المعلومات فقط.",
-                            "ب. يمكنه أداء إجراءات بسيطة بعد تأكيد صريح من المستخدم.",
-                            "ج. يمكنه أداء إجراءات متعددة الخطوات بناءً على نية المستخدم."]},
-            {"q": "What is the AI agent's ability to 'reason' and follow instructions?",
-             "q_ar": "ما هي قدرة وكيل الذكاء الاصطناعي على 'التفكير' واتباع التعليمات؟",
-             "options": ["A. It follows a rigid, linear script.",
-                         "B. It can handle a basic set of 'if-then' logic scenarios.",
-                         "C. It uses a chain of thought to break down and execute complex tasks."],
-             "options_ar": ["أ. يتبع نصًا صارمًا وخطيًا.",
-                            "ب. يمكنه التعامل مع مجموعة أساسية من سيناريوهات المنطق 'إذا-ثم'.",
-                            "ج. يستخدم سلسلة من الأفكار لتقسيم المهام المعقدة وتنفيذها."]}
-        ]
-    },
-    "Intermediate": {
-        "level_en": "Intermediate",
-        "level_ar": "متوسط",
-        "questions": [
-            {"q": "How does the AI agent handle errors or failures during a task?",
-             "q_ar": "كيف يتعامل وكيل الذكاء الاصطناعي مع الأخطاء أو الفشل أثناء مهمة ما؟",
-             "options": ["A. It fails and stops the process, requiring a human to intervene.",
-                         "B. It tries a single, pre-defined fallback option.",
-                         "C. It can identify the cause of the failure and attempt an alternative solution."],
-             "options_ar": ["أ. يفشل ويوقف العملية، مما يتطلب تدخلًا بشريًا.",
-                            "ب. يحاول خيارًا احتياطيًا واحدًا محددًا مسبقًا.",
-                            "ج. يمكنه تحديد سبب الفشل ومحاولة إيجاد حل بديل."]},
-            {"q": "How is the AI agent's performance evaluated?", "q_ar": "كيف يتم تقييم أداء وكيل الذكاء الاصطناعي؟",
-             "options": ["A. Manually, through limited human review of conversation logs.",
-                         "B. Using basic metrics like user satisfaction scores.",
-                         "C. Through a continuous feedback loop where performance metrics are monitored and used to refine the agent's behavior."],
-             "options_ar": ["أ. يدويًا، من خلال مراجعة بشرية محدودة لسجلات المحادثات.",
-                            "ب. باستخدام مقاييس أساسية مثل درجات رضا المستخدم.",
-                            "ج. من خلال حلقة تغذية راجعة مستمرة حيث يتم مراقبة مقاييس الأداء واستخدامها لتحسين سلوك الوكيل."]},
-            {"q": "Can the AI agent manage its own goals?",
-             "q_ar": "هل يمكن لوكيل الذكاء الاصطناعي أن يدير أهدافه الخاصة؟",
-             "options": ["A. No, it only executes tasks given by a human.",
-                         "B. It can be assigned a simple, singular goal.",
-                         "C. It can manage a multi-step project with a clear end goal."],
-             "options_ar": ["أ. لا، إنه ينفذ المهام الموكلة إليه من قبل إنسان فقط.", "ب. يمكن تعيين هدف بسيط وفردي له.",
-                            "ج. يمكنه إدارة مشروع متعدد الخطوات بهدف نهائي واضح."]}
-        ]
-    },
-    "Advanced": {
-        "level_en": "Advanced",
-        "level_ar": "متقدم",
-        "questions": [
-            {"q": "How much human supervision does the AI agent need?",
-             "q_ar": "ما مقدار الإشراف البشري الذي يحتاجه وكيل الذكاء الاصطناعي؟",
-             "options": ["A. It requires constant human oversight and approval for all actions.",
-                         "B. It operates with limited supervision on simple, low-risk tasks.",
-                         "C. It can act as a fully autonomous workforce, initiating and completing tasks without human intervention."],
-             "options_ar": ["أ. يتطلب إشرافًا بشريًا مستمرًا وموافقة على جميع الإجراءات.",
-                            "ب. يعمل بإشراف محدود على المهام البسيطة ومنخفضة المخاطر.",
-                            "ج. يمكنه العمل كقوة عاملة مستقلة تمامًا، بدء وإكمال المهام دون تدخل بشري."]},
-            {"q": "How does the AI agent handle ethical and safety considerations?",
-             "q_ar": "كيف يتعامل وكيل الذكاء الاصطناعي مع الاعتبارات الأخلاقية والسلامة؟",
-             "options": ["A. It has no built-in safety or ethical guidelines.",
-                         "B. It has a basic set of rules to avoid harmful content.",
-                         "C. It can reason about ethical dilemmas and make decisions that align with a pre-defined set of values."],
-             "options_ar": ["أ. ليس لديه إرشادات أمان أو أخلاقية مدمجة.",
-                            "ب. لديه مجموعة أساسية من القواعد لتجنب المحتوى الضار.",
-                            "ج. يمكنه التفكير في المعضلات الأخلاقية واتخاذ قرارات تتماشى مع مجموعة محددة مسبقًا من القيم."]},
-            {"q": "What is the AI agent's capability for collaboration?",
-             "q_ar": "ما هي قدرة وكيل الذكاء الاصطناعي على التعاون؟",
-             "options": ["A. It works in isolation and cannot interact with other agents or systems.",
-                         "B. It can exchange basic information with other agents in a predefined manner.",
-                         "C. It can orchestrate a 'swarm' of other agents to achieve a complex, overarching objective."],
-             "options_ar": ["أ. يعمل بمعزل عن الآخرين ولا يمكنه التفاعل مع الوكلاء أو الأنظمة الأخرى.",
-                            "ب. يمكنه تبادل المعلومات الأساسية مع وكلاء آخرين بطريقة محددة مسبقًا.",
-                            "ج. يمكنه تنسيق 'سرب' من الوكلاء الآخرين لتحقيق هدف معقد وشامل."]},
-            {"q": "How does the agent's work scale within the organization?",
-             "q_ar": "كيف يتوسع عمل الوكيل داخل المنظمة؟",
-             "options": ["A. It only performs a single, specific function.",
-                         "B. It can be deployed in multiple departments for a limited set of tasks.",
-                         "C. It is a core part of the organization's operational infrastructure, deployed at scale."],
-             "options_ar": ["أ. إنه يؤدي وظيفة واحدة ومحددة فقط.",
-                            "ب. يمكن نشره في أقسام متعددة لمجموعة محدودة من المهام.",
-                            "ج. إنه جزء أساسي من البنية التحتية التشغيلية للمنظمة، ويتم نشره على نطاق واسع."]},
-            {"q": "How does the agent handle unpredictable or novel situations?",
-             "q_ar": "كيف يتعامل الوكيل مع المواقف غير المتوقعة أو المستجدة؟",
-             "options": ["A. It fails or provides a generic response.",
-                         "B. It follows a limited set of pre-programmed rules for unexpected events.",
-                         "C. It can dynamically create a new plan and course of action to address the situation without human intervention."],
-             "options_ar": ["أ. يفشل أو يقدم استجابة عامة.",
-                            "ب. يتبع مجموعة محدودة من القواعد المبرمجة مسبقًا للأحداث غير المتوقعة.",
-                            "ج. يمكنه إنشاء خطة جديدة ومسار عمل ديناميكي لمعالجة الموقف دون تدخل بشري."]},
-            {"q": "How does the agent's decision-making process work?",
-             "q_ar": "كيف تعمل عملية اتخاذ القرار لدى الوكيل؟",
-             "options": ["A. It's a simple, rule-based process.", "B. It uses a single decision-making model.",
-                         "C. It has a meta-cognition layer, allowing it to reflect on its own thought process and improve how it makes decisions."],
-             "options_ar": ["أ. إنها عملية بسيطة قائمة على القواعد.", "ب. يستخدم نموذجًا واحدًا لاتخاذ القرار.",
-                            "ج. لديه طبقة من الإدراك الذاتي، مما يسمح له بالتفكير في عملية تفكيره وتحسين طريقة اتخاذ القرارات."]}
-        ]
-    }
-}
-
-# English and Arabic translations for the results
-LEVELS = {
-    "Minimal": {"en": "Minimal", "ar": "أساسي"},
-    "Emerging": {"en": "Emerging", "ar": "ناشئ"},
-    "Basic": {"en": "Basic", "ar": "مبتدئ"},
-    "Intermediate": {"en": "Intermediate", "ar": "متوسط"},
-    "Advanced": {"en": "Advanced", "ar": "متقدم"},
-}
-
-RECOMMENDATIONS = {
-    "Minimal": {
-        "en": "Your organization is at the foundational stage of AI agent adoption. To advance, focus on expanding your AI assistant's capabilities beyond simple Q&A and integrating it with more business functions.",
-        "ar": "منظمتك في المرحلة التأسيسية لاعتماد وكلاء الذكاء الاصطناعي. للتقدم، ركز على توسيع قدرات مساعد الذكاء الاصطناعي الخاص بك لتتجاوز الأسئلة والأجوبة البسيطة ودمجها مع المزيد من وظائف الأعمال."
-    },
-    "Emerging": {
-        "en": "Your organization is effectively using conversational AI. The next step is to transition from an assistant to a true agent by leveraging Large Language Models to perform multi-step tasks.",
-        "ar": "تستخدم منظمتك الذكاء الاصطناعي للمحادثة بفعالية. الخطوة التالية هي الانتقال من المساعد إلى الوكيل الحقيقي من خلال الاستفادة من نماذج اللغة الكبيرة لأداء مهام متعددة الخطوات."
-    },
-    "Basic": {
-        "en": "You are on the right path with an LLM-based agent. To reach the next level, you need to build in learning loops and error-handling capabilities so your agents can adapt and improve over time.",
-        "ar": "أنت على الطريق الصحيح مع وكيل قائم على LLM. للوصول إلى المستوى التالي، تحتاج إلى بناء حلقات تعلم وقدرات على التعامل مع الأخطاء حتى يتمكن وكلاؤك من التكيف والتحسن بمرور الوقت."
-    },
-    "Intermediate": {
-        "en": "Your agents are already learning and adapting. To achieve autonomy, focus on a framework for your agents to operate with minimal human supervision and handle complex, unpredictable situations on their own.",
-        "ar": "وكلاؤك يتعلمون ويتكيفون بالفعل. لتحقيق الاستقلالية، ركز على إطار عمل لوكلائك للعمل بأقل قدر من الإشراف البشري والتعامل مع المواقف المعقدة وغير المتوقعة بمفردهم."
-    },
-    "Advanced": {
-        "en": "Congratulations! Your organization is a leader in AI agent maturity. Your focus should be on scaling your autonomous agents to new domains and exploring how they can orchestrate and manage entire business processes.",
-        "ar": "تهانينا! منظمتك هي رائدة في نضج وكيل الذكاء الاصطناعي. يجب أن يكون تركيزك على توسيع نطاق وكلاء الذكاء الاصطناعي المستقلين إلى مجالات جديدة واستكشاف كيف يمكنهم تنظيم وإدارة عمليات الأعمال بأكملها."
-    }
-}
-
-
-def calculate_maturity(answers_str):
-    total_score = 0
+# The SMTP configuration is read directly from environment variables by the mailer module.
+# Result emails are queued there and delivered by background workers over pooled connections.
+
+RESULT_EMAIL_SUBJECT = "Your Agentic AI Maturity Assessment Result"
+
+# Per-client limits, shared by all workers on the host (see admission.py).
+REQUEST_LIMIT = admission.parse_limit(os.environ.get('RATE_LIMIT_REQUESTS', '300/minute'))
+EMAIL_IP_LIMIT = admission.parse_limit(os.environ.get('RATE_LIMIT_EMAILS_PER_IP', '10/hour'))
+EMAIL_RECIPIENT_LIMIT = admission.parse_limit(os.environ.get('RATE_LIMIT_EMAILS_PER_RECIPIENT', '3/hour'))
+# The same answers sent again by the same client (a retry, or the results sent to a second
+# address) are stored in the results log once per window.
+RECORD_ONCE = admission.Limit(1, admission.PERIODS['day'])
+# Endpoints counted against REQUEST_LIMIT; assets, metrics and analytics are not.
+RATE_LIMITED_ENDPOINTS = {'index', 'set_language', 'survey', 'survey_app', 'survey_definition', 'score', 'final',
+                          'thanks'}
+
+# Survey versions from surveys/*.json, compiled once and reloaded when a file changes.
+surveys = SurveyRegistry(os.path.join(app.root_path, survey_loader.SURVEYS_DIR))
+
+
+def parse_answers(answers_str):
+    """Parses a legacy ``q_<level>_<i>=<option>&...`` answers string."""
     answers = {}
     if answers_str:
         try:
             answers = dict(item.split("=") for item in answers_str.split("&"))
         except ValueError:
             answers = {}
+    return answers
 
-    level_scores_breakdown = {"Minimal": 0, "Emerging": 0, "Basic": 0, "Intermediate": 0, "Advanced": 0}
-
-    for level, data in QUESTIONS.items():
-        for i in range(len(data["questions"])):
-            answer_key = f"q_{level}_{i}"
-            user_answer = answers.get(answer_key)
-            if user_answer:
-                if user_answer.startswith('B'):
-                    total_score += 1
-                    level_scores_breakdown[level] += 1
-                elif user_answer.startswith('C'):
-                    total_score += 2
-                    level_scores_breakdown[level] += 2
-
-    if total_score <= 6:
-        final_level = "Minimal"
-    elif 7 <= total_score <= 12:
-        final_level = "Emerging"
-    elif 13 <= total_score <= 19:
-        final_level = "Basic"
-    elif 20 <= total_score <= 26:
-        final_level = "Intermediate"
-    else:
-        final_level = "Advanced"
 
-    return final_level, level_scores_breakdown
+def _update_analytics(records):
+    analytics.apply(records, surveys.by_id)
 
 
-def send_email_via_smtp(receiver_email, subject, html_content, bcc_email=None):
-    """Sends an email using the smtplib library."""
-    try:
-        smtp_server = os.environ.get('MAIL_SERVER')
-        smtp_port = int(os.environ.get('MAIL_PORT', 465))
-        sender_email = os.environ.get('MAIL_USERNAME')
-        sender_password = os.environ.get('MAIL_PASSWORD')
+results_store.add_commit_listener(_update_analytics)
 
-        msg = MIMEText(html_content, 'html', 'utf-8')
-        msg['Subject'] = subject
-        msg['From'] = sender_email
-        msg['To'] = receiver_email
 
-        # Handle multiple recipients including BCC
-        recipients = [receiver_email]
-        if bcc_email:
-            recipients.append(bcc_email)
-            msg['Bcc'] = bcc_email
+def calculate_maturity(answers, survey=None):
+    """Scores a legacy answers string or a ``{answer key: option}`` mapping."""
+    survey = survey or surveys.get()
+    if isinstance(answers, str):
+        answers = parse_answers(answers)
+    return calculate_state_maturity(survey.pack(answers), survey)
 
-        with smtplib.SMTP_SSL(smtp_server, smtp_port) as server:
-            server.login(sender_email, sender_password)
-            server.sendmail(sender_email, recipients, msg.as_string())
 
-        print("Email sent successfully!")
-        return True
-    except Exception as e:
-        print(f"Error sending email: {e}")
-        return False
+def calculate_state_maturity(state, survey=None):
+    survey = survey or surveys.get()
+    scores = survey.state_scores(state)
+    final_level = survey.final_level(sum(scores))
+    level_scores_breakdown = dict(zip(survey.level_names, scores))
+
+    return final_level, level_scores_breakdown
+
+
+def render_result_email(final_level, level_scores, survey=None):
+    """Renders the result email body; needs an app or request context."""
+    survey = survey or surveys.get()
+    return render_cache.render('email_template.html',
+                               (survey.name, survey.fingerprint, final_level, tuple(level_scores.values())),
+                               final_level_en=survey.labels[final_level]["en"],
+                               final_level_ar=survey.labels[final_level]["ar"],
+                               level_scores=level_scores,
+                               recommendation_en=survey.recommendations[final_level]["en"],
+                               recommendation_ar=survey.recommendations[final_level]["ar"],
+                               total_score=sum(level_scores.values()))
+
+
+@lru_cache(maxsize=16)
+def survey_definition_json(survey):
+    """The survey as served to the single-page client, serialized once per loaded version."""
+    return json.dumps({
+        'version': survey.name,
+        'fingerprint': survey.fingerprint,
+        'levels': [{'name': level.name,
+                    'level_en': level.level_en,
+                    'level_ar': level.level_ar,
+                    'questions': [{'key': q.key, 'q': q.q, 'q_ar': q.q_ar,
+                                   'options': q.options, 'options_ar': q.options_ar}
+                                  for q in level.questions]}
+                   for level in survey.levels],
+    }, ensure_ascii=False, separators=(',', ':'))
+
+
+def request_state():
+    """Returns the survey version and packed answer state of the request.
+
+    They come from the ``state`` token, or for a fresh start from ``?v=<version>``
+    and a legacy ``answers`` string.
+    """
+    token = request.values.get('state')
+    if token:
+        version_id, state = decode_state(token, app.secret_key)
+        survey = surveys.by_id(version_id)
+        if survey is not None and survey.valid_state(state):
+            return survey, state
+    survey = surveys.get(request.args.get('v'))
+    return survey, survey.pack(parse_answers(request.args.get('answers', '')))
+
+
+def page_lang(lang):
+    """Language a page is rendered in: 'ar', or 'en' for a missing or unknown value."""
+    return lang if lang in ('en', 'ar') else 'en'
+
+
+def metric_lang(lang):
+    """Language as a metric label; every unknown value shares one series."""
+    return lang if lang in results_store.LANGS else 'other'
+
+
+def too_many_requests(retry_after, scope):
+    metrics.inc('survey_rate_limited_total', scope=scope)
+    return ("Too many requests. Please try again later.", 429,
+            {'Retry-After': str(math.ceil(retry_after))})
+
+
+@app.before_request
+def start_timer():
+    g.request_start = time.perf_counter()
+    surveys.start_polling()
+    # also picks up edits to templates rendered without the cache (index, thanks)
+    render_cache.refresh()
+    # deliver mail left in the queue by an earlier run without waiting for a new submission
+    mailer.start_workers()
+
+
+@app.before_request
+def admit_request():
+    global _warned_proxy
+    if not PROXY_COUNT and not _warned_proxy and 'X-Forwarded-For' in request.headers:
+        _warned_proxy = True
+        print("Warning: requests arrive through a proxy but PROXY_COUNT is 0; "
+              "all clients share the proxy's rate limits")
+    if request.endpoint in RATE_LIMITED_ENDPOINTS:
+        retry_after = admission.take((f'ip:{request.remote_addr}', REQUEST_LIMIT))
+        if retry_after:
+            return too_many_requests(retry_after, 'requests')
+
+
+@app.after_request
+def record_request_time(response):
+    start = g.pop('request_start', None)
+    if start is not None:
+        metrics.observe('survey_http_request_duration_seconds', time.perf_counter() - start,
+                        endpoint=request.endpoint or 'unknown', method=request.method)
+    return response
+
+
+@app.route('/assets/<path:filename>')
+def asset(filename):
+    # Only built files are immutable; anything else in dist (the manifest itself) is not served here
+    built = filename[:-3] if filename.endswith(('.gz', '.br')) else filename
+    if built not in ASSET_MANIFEST.values():
+        return "Not found", 404
+    dist = os.path.join(app.static_folder, assets.DIST_DIR)
+    stored, encoding = assets.precompressed(dist, filename, request.headers.get('Accept-Encoding', ''))
+    response = send_from_directory(dist, stored, mimetype=mimetypes.guess_type(filename)[0], max_age=assets.MAX_AGE)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.headers['Cache-Control'] = f'public, max-age={assets.MAX_AGE}, immutable'
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+@app.route('/metrics')
+def metrics_endpoint():
+    return metrics.render(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
 
 
 @app.route('/')
 def index():
-    lang = request.args.get('lang', 'en')
-    return render_template('index.html', lang=lang,
-                           logo_url=url_for('static', filename='img/rasheed_logo.png'))
+    lang = page_lang(request.args.get('lang'))
+    survey = surveys.get(request.args.get('v'))
+    return render_template('index.html', lang=lang, first_level=survey.level_names[0],
+                           version=request.args.get('v'))
 
 
 @app.route('/set_language/<lang>')
@@ -310,91 +256,160 @@ def set_language(lang):
 
 @app.route('/survey/<level>', methods=['GET', 'POST'])
 def survey(level):
-    levels = list(QUESTIONS.keys())
-    try:
-        level_index = levels.index(level)
-    except ValueError:
+    survey, state = request_state()
+    level_data = survey.level(level)
+    if level_data is None:
         return "Invalid survey level", 404
 
-    lang = request.args.get('lang', 'en')
-    previous_answers = request.args.get('answers', '')
-    level_data = QUESTIONS[level]
+    levels = survey.level_names
+    level_index = level_data.position
+    lang = page_lang(request.args.get('lang'))
 
     if request.method == 'POST':
-        all_answers_dict = {}
-        if request.form.get('previous_answers'):
-            all_answers_dict = dict(item.split("=") for item in request.form.get('previous_answers').split("&"))
-
-        for i in range(len(level_data["questions"])):
-            answer_key = f"q_{level}_{i}"
-            all_answers_dict[answer_key] = request.form.get(f"q_{level}_{i}")
-
-        new_answers = "&".join([f"{key}={value}" for key, value in all_answers_dict.items() if value])
+        state = survey.with_level(state, level_data, [request.form.get(key) for key in level_data.answer_keys])
+        token = encode_state(state, app.secret_key, survey.version_id)
 
         if level_index + 1 < len(levels):
             next_level = levels[level_index + 1]
-            return redirect(url_for('survey', level=next_level, answers=new_answers, lang=lang))
+            return redirect(url_for('survey', level=next_level, state=token, lang=lang))
         else:
-            return redirect(url_for('final', answers=new_answers, lang=lang))
-
-    return render_template('survey.html',
-                           level_data=level_data,
-                           current_level=level,
-                           level_index=level_index,
-                           total_levels=len(levels),
-                           logo_url=url_for('static', filename='img/rasheed_logo.png'),
-                           lang=lang,
-                           previous_answers=previous_answers,
-                           levels=levels)
+            final_level, _ = calculate_state_maturity(state, survey)
+            metrics.inc('survey_completed_total', final_level=final_level, lang=metric_lang(lang))
+            return redirect(url_for('final', state=token, lang=lang))
+
+    html = render_cache.render('survey.html', (survey.name, survey.fingerprint, level, lang),
+                               level_data=level_data,
+                               current_level=level,
+                               level_index=level_index,
+                               total_levels=len(levels),
+                               lang=lang,
+                               state=STATE_PLACEHOLDER,
+                               levels=levels)
+    return html.replace(STATE_PLACEHOLDER, encode_state(state, app.secret_key, survey.version_id))
+
+
+@app.route('/survey')
+def survey_app():
+    """Single-page survey: the definition is fetched once and all answers are scored in one request."""
+    lang = page_lang(request.args.get('lang'))
+    survey = surveys.get(request.args.get('v'))
+    return render_cache.render('survey_app.html', (survey.name, survey.fingerprint, lang),
+                               lang=lang,
+                               definition_url=url_for('survey_definition', v=survey.name, fp=survey.fingerprint),
+                               score_url=url_for('score'),
+                               final_url=url_for('final', lang=lang))
+
+
+@app.route('/survey.json')
+def survey_definition():
+    survey = surveys.get(request.args.get('v'))
+    response = app.response_class(survey_definition_json(survey), mimetype='application/json')
+    response.set_etag(survey.fingerprint)
+    if request.args.get('fp') == survey.fingerprint:
+        # the URL names this exact definition, so it can be cached like a fingerprinted asset
+        response.headers['Cache-Control'] = f'public, max-age={assets.MAX_AGE}, immutable'
+    else:
+        response.headers['Cache-Control'] = 'public, no-cache'
+    return response.make_conditional(request)
+
+
+@app.route('/score', methods=['POST'])
+def score():
+    """Scores a whole assessment posted as ``{"v": ..., "lang": ..., "answers": {key: option}}``."""
+    data = request.get_json(silent=True)
+    answers = data.get('answers') if isinstance(data, dict) else None
+    if not isinstance(answers, dict) or not all(isinstance(value, str) for value in answers.values()):
+        return jsonify(error="Expected a JSON object with an 'answers' object of strings"), 400
+    version = data.get('v')
+    survey = surveys.get(version if isinstance(version, str) else None)
+    lang = page_lang(data.get('lang'))
+
+    final_level, level_scores = calculate_maturity(answers, survey)
+    metrics.inc('survey_completed_total', final_level=final_level, lang=metric_lang(lang))
+    return jsonify(version=survey.name,
+                   final_level=final_level,
+                   final_level_label=survey.labels[final_level],
+                   level_scores=level_scores,
+                   total_score=sum(level_scores.values()),
+                   recommendation=survey.recommendations[final_level],
+                   state=encode_state(survey.pack(answers), app.secret_key, survey.version_id))
 
 
 @app.route('/final', methods=['GET', 'POST'])
 def final():
-    lang = request.args.get('lang', 'en')
-    answers_str = request.args.get('answers', '')
+    lang = page_lang(request.args.get('lang'))
+    survey, state = request_state()
 
-    final_level, level_scores = calculate_maturity(answers_str)
-    total_score = sum(level_scores.values())
+    final_level, level_scores = calculate_state_maturity(state, survey)
     if request.method == 'POST':
-        user_email = request.form.get('email')
+        user_email = mailer.normalize_address(request.form.get('email'))
         bcc_email = os.environ.get('BCC_EMAIL')
+        if user_email is None:
+            return "Please enter a valid email address.", 400
 
-        final_level_en = LEVELS[final_level]["en"]
-        final_level_ar = LEVELS[final_level]["ar"]
-        recommendation_en = RECOMMENDATIONS[final_level]["en"]
-        recommendation_ar = RECOMMENDATIONS[final_level]["ar"]
-
-        html_content = render_template('email_template.html',
-                                       final_level_en=final_level_en,
-                                       final_level_ar=final_level_ar,
-                                       level_scores=level_scores,
-                                       recommendation_en=recommendation_en,
-                                       recommendation_ar=recommendation_ar,
-                                       total_score=total_score,
-                                       logo_url=url_for('static', filename='img/rasheed_logo.png'))
-
-        if send_email_via_smtp(user_email, "Your Agentic AI Maturity Assessment Result", html_content, bcc_email):
-            return render_template('thanks.html', message="Your results have been sent to your email. Thank you!",
-                                   lang=lang)
-        else:
+        retry_after = admission.take((f'email-ip:{request.remote_addr}', EMAIL_IP_LIMIT),
+                                     (f'email-to:{user_email.lower()}', EMAIL_RECIPIENT_LIMIT))
+        if retry_after:
+            return too_many_requests(retry_after, 'email')
+
+        html_content = render_result_email(final_level, level_scores, survey)
+
+        try:
+            mailer.enqueue_email(user_email, RESULT_EMAIL_SUBJECT, html_content, bcc_email)
+        except Exception as e:
+            print(f"Error queueing email: {e}")
             return "An error occurred while sending the email. Please check your SMTP configuration and try again.", 500
+        if not admission.take((f'recorded:{request.remote_addr}:{survey.version_id}:{state:x}', RECORD_ONCE)):
+            results_store.record(state, tuple(level_scores.values()), survey.level_index[final_level], lang,
+                                 survey.version_id)
+        return render_template('thanks.html', message="Your results have been sent to your email. Thank you!",
+                               lang=lang)
+
+    html = render_cache.render('final.html',
+                               (survey.name, survey.fingerprint, lang, final_level, tuple(level_scores.values())),
+                               lang=lang,
+                               final_level=final_level,
+                               level_scores=level_scores,
+                               recommendations=survey.recommendations,
+                               levels=survey.labels,
+                               state=STATE_PLACEHOLDER)
+    return html.replace(STATE_PLACEHOLDER, encode_state(state, app.secret_key, survey.version_id))
+
+
+def _analytics_response(report):
+    try:
+        data = blocking.call(report,
+                             bucket=request.args.get('bucket', 'day'),
+                             start=request.args.get('from'),
+                             end=request.args.get('to'),
+                             lang=request.args.get('lang'))
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+    return jsonify(data)
+
+
+@app.route('/analytics/levels')
+def analytics_levels():
+    return _analytics_response(analytics.level_distribution)
+
+
+@app.route('/analytics/scores')
+def analytics_scores():
+    return _analytics_response(analytics.mean_scores)
+
 
-    return render_template('final.html',
-                           logo_url=url_for('static', filename='img/rasheed_logo.png'),
-                           lang=lang,
-                           final_level=final_level,
-                           level_scores=level_scores,
-                           recommendations=RECOMMENDATIONS,
-                           levels=LEVELS,
-                           answers_str=answers_str)
+@app.route('/analytics/picks')
+def analytics_picks():
+    return _analytics_response(analytics.pick_rates)
 
 
 @app.route('/thanks')
 def thanks():
-    lang = request.args.get('lang', 'en')
+    lang = page_lang(request.args.get('lang'))
     return render_template('thanks.html', message="Your results have been sent to your email. Thank you!",
                            lang=lang)
 
 
 if __name__ == '__main__':
+    ASSET_MANIFEST.update(assets.build(app.static_folder))
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,154 @@
+"""Static asset pipeline.
+
+build() copies the static sources into static/dist under content-hashed names:
+the logo is recompressed and, when Pillow is installed, also written as WebP
+and in the smaller sizes the pages actually display; CSS is minified. Text
+assets get precompressed .gz (and .br with the brotli package) siblings.
+manifest.json maps each logical name ('img/rasheed_logo-160.webp') to its
+hashed file, and templates resolve URLs through asset_url().
+
+Run once by gunicorn's on_starting hook before the workers load the manifest,
+by app.py's development server, or ahead of time (e.g. as a release step) with:
+
+    python assets.py
+"""
+import gzip
+import hashlib
+import io
+import json
+import os
+import re
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+DIST_DIR = 'dist'
+MANIFEST = 'manifest.json'
+IMAGES = ('img/rasheed_logo.png',)
+STYLESHEETS = ('css/style.css',)
+# Logo heights used by the pages (2x their CSS size) and the favicon.
+IMAGE_HEIGHTS = (160, 64)
+COMPRESSIBLE = ('.css', '.js', '.svg')
+MAX_AGE = 365 * 24 * 3600
+
+
+def minify_css(css):
+    css = re.sub(r'/\*.*?\*/', '', css, flags=re.S)
+    css = re.sub(r'\s+', ' ', css)
+    css = re.sub(r'\s*([{};,>])\s*', r'\1', css)
+    css = re.sub(r':\s+', ':', css)
+    return css.replace(';}', '}').strip()
+
+
+def _encode_image(image, fmt):
+    out = io.BytesIO()
+    if fmt == 'WEBP':
+        image.save(out, 'WEBP', quality=85, method=6)
+    else:
+        image.save(out, 'PNG', optimize=True)
+    return out.getvalue()
+
+
+def _image_outputs(name, data):
+    """Yields (logical name, bytes) for the recompressed image and its variants."""
+    base, ext = os.path.splitext(name)
+    if Image is None:
+        yield name, data
+        return
+    image = Image.open(io.BytesIO(data))
+    image.load()
+    optimized = _encode_image(image, 'PNG')
+    yield name, optimized if len(optimized) < len(data) else data
+    yield base + '.webp', _encode_image(image, 'WEBP')
+    for height in IMAGE_HEIGHTS:
+        if height >= image.height:
+            continue
+        width = round(image.width * height / image.height)
+        resized = image.resize((width, height), Image.LANCZOS)
+        yield f'{base}-{height}{ext}', _encode_image(resized, 'PNG')
+        yield f'{base}-{height}.webp', _encode_image(resized, 'WEBP')
+
+
+def _write(path, data):
+    if os.path.exists(path):
+        return
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def _emit(dist, name, data, manifest):
+    base, ext = os.path.splitext(name)
+    hashed = f'{base}.{hashlib.sha256(data).hexdigest()[:12]}{ext}'
+    path = os.path.join(dist, hashed)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    _write(path, data)
+    if ext in COMPRESSIBLE:
+        _write(path + '.gz', gzip.compress(data, 9, mtime=0))
+        if brotli is not None:
+            _write(path + '.br', brotli.compress(data))
+    manifest[name] = hashed
+
+
+def _up_to_date(static_folder, manifest_path):
+    try:
+        built = os.path.getmtime(manifest_path)
+    except OSError:
+        return False
+    return all(os.path.getmtime(os.path.join(static_folder, name)) <= built for name in IMAGES + STYLESHEETS)
+
+
+def build(static_folder, force=False):
+    """Builds static/dist and returns the manifest; skipped when the sources are unchanged."""
+    dist = os.path.join(static_folder, DIST_DIR)
+    manifest_path = os.path.join(dist, MANIFEST)
+    if not force and _up_to_date(static_folder, manifest_path):
+        return load_manifest(static_folder)
+
+    manifest = {}
+    for name in IMAGES:
+        with open(os.path.join(static_folder, name), 'rb') as f:
+            data = f.read()
+        for output_name, output in _image_outputs(name, data):
+            _emit(dist, output_name, output, manifest)
+    for name in STYLESHEETS:
+        with open(os.path.join(static_folder, name), encoding='utf-8') as f:
+            _emit(dist, name, minify_css(f.read()).encode('utf-8'), manifest)
+
+    tmp = f'{manifest_path}.{os.getpid()}.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp, manifest_path)
+    return manifest
+
+
+def load_manifest(static_folder):
+    try:
+        with open(os.path.join(static_folder, DIST_DIR, MANIFEST)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def precompressed(dist, filename, accept_encoding):
+    """Returns ``(filename, content encoding)`` of the best stored encoding the client accepts."""
+    accepted = {part.split(';')[0].strip() for part in accept_encoding.lower().split(',')}
+    for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+        if encoding in accepted and os.path.isfile(os.path.join(dist, filename + suffix)):
+            return filename + suffix, encoding
+    return filename, None
+
+
+if __name__ == '__main__':
+    static = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+    for logical, hashed in sorted(build(static, force=True).items()):
+        size = os.path.getsize(os.path.join(static, DIST_DIR, hashed))
+        print(f"{logical} -> {DIST_DIR}/{hashed} ({size} bytes)")
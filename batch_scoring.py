@@ -0,0 +1,206 @@
+"""Batch re-scoring of stored ``answers`` strings.
+
+Answer strings are parsed into a respondents x questions matrix of points
+(0/1/2) and scored with NumPy in fixed-size chunks, so arbitrarily large dumps
+are processed in bounded memory. Parsing and output work a column at a time
+with NumPy string operations rather than row by row. Results are identical to
+calculate_maturity().
+
+Usage:
+    python batch_scoring.py answers.jsonl -o scores.csv
+    python batch_scoring.py answers.csv --column answers --summary
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+
+import numpy as np
+
+import survey_loader
+from survey_model import MAX_QUESTIONS
+
+CHUNK_SIZE = 100_000
+surveys = survey_loader.SurveyRegistry(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), survey_loader.SURVEYS_DIR))
+# Survey version used when none is passed; see --survey.
+SURVEY = surveys.get()
+AMPERSAND, EQUALS = ord('&'), ord('=')
+# The text of every score and total a survey can produce (at most 2 points per question).
+NUMBERS = np.array([str(i) for i in range(2 * MAX_QUESTIONS + 1)])
+
+
+def answer_matrix(answer_strings, survey=SURVEY):
+    """Parses answer strings into an int8 matrix of shape (respondents, questions).
+
+    Like parse_answers(), a malformed string counts as no answers and a repeated
+    key keeps its last value; so does anything that is not a string.
+    """
+    matrix = np.zeros((len(answer_strings), len(survey.answer_keys)), dtype=np.int8)
+    if not answer_strings:
+        return matrix
+    strings = [answers_str if isinstance(answers_str, str) else '' for answers_str in answer_strings]
+
+    # All rows back to back as '&key=value&key=value...', plus a closing '&', as one array of code points
+    codes = np.frombuffer(('&' + '&'.join(strings) + '&').encode('utf-32-le', 'surrogatepass'), dtype=np.uint32)
+    separators = np.flatnonzero((codes == AMPERSAND) | (codes == EQUALS))
+    row_starts = np.cumsum([0] + [len(answers_str) + 1 for answers_str in strings[:-1]])
+    first_separators = np.searchsorted(separators, row_starts)
+    separator_rows = np.repeat(np.arange(len(strings)), np.diff(first_separators, append=len(separators)))
+    is_item = codes[separators] == AMPERSAND
+
+    # parse_answers() rejects a row unless every item holds exactly one '=', i.e. '&' and '=' alternate
+    malformed = np.zeros(len(strings), dtype=bool)
+    malformed[separator_rows[:-1][is_item[:-1] == is_item[1:]]] = True
+    items = np.flatnonzero(is_item[:-1] & ~malformed[separator_rows[:-1]])
+    item_rows = separator_rows[items]
+    key_starts = separators[items] + 1
+    value_starts = separators[items + 1] + 1
+
+    # points for the first character of each value; 0 for an empty value or an unknown option
+    letters = np.where(value_starts < separators[items + 2], codes[value_starts], 0)
+    points = np.zeros(len(items), dtype=np.int8)
+    for option, score in survey.option_scores.items():
+        points[letters == ord(option)] = score
+
+    # question column of each item's key, -1 if it is not one of the survey's; compared per key length
+    columns = np.full(len(items), -1)
+    key_lengths = value_starts - key_starts - 1
+    for length in {len(key) for key, _ in survey.answer_keys}:
+        same_length = np.flatnonzero(key_lengths == length)
+        # every position of the buffer read as the start of a string of this length
+        windows = np.ndarray((max(len(codes) - length + 1, 0),), dtype=f'U{length}', buffer=codes, strides=(4,))
+        keys = windows[key_starts[same_length]]
+        known = sorted((key, i) for i, (key, _) in enumerate(survey.answer_keys) if len(key) == length)
+        known_keys = np.array([key for key, _ in known])
+        position = np.minimum(np.searchsorted(known_keys, keys), len(known) - 1)
+        match = known_keys[position] == keys
+        columns[same_length[match]] = np.array([i for _, i in known])[position[match]]
+
+    # the last answer for each (row, question) wins
+    answered = np.flatnonzero(columns >= 0)
+    last = np.full(matrix.size, -1)
+    np.maximum.at(last, item_rows[answered] * matrix.shape[1] + columns[answered], answered)
+    last = last[last >= 0]
+    matrix[item_rows[last], columns[last]] = points[last]
+    return matrix
+
+
+def score_matrix(matrix, survey=SURVEY):
+    """Scores an answer matrix.
+
+    Returns ``(breakdown, totals, level_index)``: per-level points with shape
+    (respondents, levels), total points, and the position of each final level.
+    """
+    starts = np.cumsum([0] + [len(level.questions) for level in survey.levels[:-1]])
+    breakdown = np.add.reduceat(matrix, starts, axis=1, dtype=np.int16)
+    totals = breakdown.sum(axis=1)
+    level_index = np.searchsorted(np.asarray(survey.thresholds), totals, side='left')
+    return breakdown, totals, level_index
+
+
+def read_answers(path, fmt=None, column='answers'):
+    """Yields the answers strings stored in a JSONL or CSV file ('-' for stdin); '' for anything else."""
+    if fmt is None:
+        fmt = 'csv' if path.endswith('.csv') else 'jsonl'
+    f = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+    try:
+        if fmt == 'csv':
+            for row in csv.DictReader(f):
+                yield row.get(column) or ''
+        else:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                record = json.loads(line)
+                value = record.get(column) if isinstance(record, dict) else record
+                yield value if isinstance(value, str) else ''
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+
+def iter_chunks(answer_strings, chunk_size=CHUNK_SIZE):
+    chunk = []
+    for answers_str in answer_strings:
+        chunk.append(answers_str)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def join_columns(parts):
+    """Concatenates string constants and per-row string columns into one string per row."""
+    line = ''
+    for part in parts:
+        line = np.char.add(line, part)
+    return line
+
+
+def score_file(path, out, fmt=None, column='answers', out_format='csv', chunk_size=CHUNK_SIZE, survey=SURVEY):
+    """Scores every row of ``path`` and writes one result per row to ``out``.
+
+    Returns the number of respondents at each final level.
+    """
+    distribution = np.zeros(len(survey.levels), dtype=np.int64)
+    if out_format == 'csv':
+        csv.writer(out).writerow(['row'] + list(survey.level_names) + ['total_score', 'final_level'])
+        # level names are \w+, so csv.writer would never quote them
+        final_levels = np.array(survey.level_names)
+    else:
+        # the pieces json.dumps() writes around each value
+        final_levels = np.array([json.dumps(name) for name in survey.level_names])
+        score_labels = [json.dumps(name) + ': ' for name in survey.level_names]
+
+    row = 0
+    for chunk in iter_chunks(read_answers(path, fmt, column), chunk_size):
+        breakdown, totals, level_index = score_matrix(answer_matrix(chunk, survey), survey)
+        distribution += np.bincount(level_index, minlength=len(survey.levels))
+        rows = np.arange(row, row + len(chunk)).astype(str)
+        if out_format == 'csv':
+            parts = [rows]
+            for scores in breakdown.T:
+                parts += [',', NUMBERS[scores]]
+            parts += [',', NUMBERS[totals], ',', final_levels[level_index], '\r\n']
+        else:
+            parts = ['{"row": ', rows, ', "final_level": ', final_levels[level_index],
+                     ', "total_score": ', NUMBERS[totals], ', "level_scores": {']
+            for i, scores in enumerate(breakdown.T):
+                parts += [', ' + score_labels[i] if i else score_labels[i], NUMBERS[scores]]
+            parts.append('}}\n')
+        out.write(''.join(join_columns(parts).tolist()))
+        row += len(chunk)
+    return dict(zip(survey.level_names, distribution.tolist()))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Re-score stored survey answers in bulk.")
+    parser.add_argument('input', help="JSONL or CSV file of answers strings, or '-' for stdin")
+    parser.add_argument('-o', '--output', default='-', help="where to write per-row scores (default: stdout)")
+    parser.add_argument('--input-format', choices=['jsonl', 'csv'], help="defaults to the input file extension")
+    parser.add_argument('--output-format', choices=['jsonl', 'csv'], help="defaults to the output file extension")
+    parser.add_argument('--column', default='answers', help="CSV column / JSON field holding the answers string")
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    parser.add_argument('--survey', help="survey version the answers were given for (default: the current one)")
+    parser.add_argument('--summary', action='store_true', help="print the final level distribution to stderr")
+    args = parser.parse_args(argv)
+
+    survey = surveys.get(args.survey)
+    out_format = args.output_format or ('jsonl' if args.output.endswith('.jsonl') else 'csv')
+    out = sys.stdout if args.output == '-' else open(args.output, 'w', newline='', encoding='utf-8')
+    try:
+        distribution = score_file(args.input, out, args.input_format, args.column, out_format, args.chunk_size,
+                                  survey)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    if args.summary:
+        print(json.dumps(distribution), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
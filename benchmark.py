@@ -0,0 +1,281 @@
+"""Latency benchmark for the full survey funnel.
+
+Each iteration walks index -> survey/<level> (GET + POST per level) -> final
+(GET) -> final (POST, queues the result email). With --single-page it loads the
+single-page survey, its JSON definition and posts all answers to /score
+instead of the per-level pages. Email is delivered to a local fake SMTP
+server, so the delivery workers are exercised too.
+
+    python benchmark.py --iterations 500 -o bench.json
+    python benchmark.py --iterations 500 --single-page
+    python benchmark.py --url http://127.0.0.1:8000 --concurrency 16 --smtp-port 8025
+
+By default the app runs in-process through the Flask test client, with its
+mail queue, results log, analytics, rate limits and metrics in a temporary
+directory, and the CPU time spent scoring and rendering templates is reported
+as well. With --url the
+funnel is driven over HTTP against a running server; start that server with
+MAIL_SERVER/MAIL_PORT pointing at --smtp-port to include email delivery, and
+raise its RATE_LIMIT_* settings, since every funnel comes from one client.
+"""
+import argparse
+import contextlib
+import http.client
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode, urlsplit
+
+from fake_smtp import FakeSMTPServer
+
+ROUTES = ('index', 'survey GET', 'survey POST', 'survey page GET', 'definition GET', 'score POST',
+          'final GET', 'final POST')
+
+
+class TestClientDriver:
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, data=None, json_body=None):
+        response = self.client.open(path, method=method, data=data, json=json_body)
+        return response.status_code, response.location, response.data
+
+
+class HTTPDriver:
+    def __init__(self, url):
+        parts = urlsplit(url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.local = threading.local()
+
+    def request(self, method, path, data=None, json_body=None):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = self.local.conn = http.client.HTTPConnection(self.host, self.port, timeout=30)
+        if json_body is not None:
+            body = json.dumps(json_body)
+            headers = {'Content-Type': 'application/json'}
+        else:
+            body = urlencode(data) if data else None
+            headers = {'Content-Type': 'application/x-www-form-urlencoded'} if body else {}
+        try:
+            conn.request(method, path, body, headers)
+            response = conn.getresponse()
+        except (http.client.HTTPException, OSError):
+            conn.close()
+            self.local.conn = None
+            raise
+        content = response.read()
+        location = response.getheader('Location')
+        if location:
+            parts = urlsplit(location)
+            location = parts.path + ('?' + parts.query if parts.query else '')
+        return response.status, location, content
+
+
+def run_funnel(driver, survey, timings, option='B', lang='en'):
+    """Completes one assessment, appending (route, seconds) pairs to ``timings``."""
+    def timed(route, method, path, data=None):
+        start = time.perf_counter()
+        status, location, _ = driver.request(method, path, data)
+        timings.append((route, time.perf_counter() - start))
+        if status >= 400:
+            raise RuntimeError(f"{method} {path} returned {status}")
+        return location
+
+    timed('index', 'GET', f'/?lang={lang}')
+    path = f'/survey/{survey.level_names[0]}?lang={lang}'
+    for level in survey.levels:
+        timed('survey GET', 'GET', path)
+        state = path.partition('state=')[2].partition('&')[0]
+        form = {key: option for key in level.answer_keys}
+        form['state'] = state
+        path = timed('survey POST', 'POST', f'/survey/{level.name}?lang={lang}', form)
+    timed('final GET', 'GET', path)
+    timed('final POST', 'POST', path, {'email': 'benchmark@example.com'})
+
+
+def run_single_page(driver, survey, timings, option='B', lang='en'):
+    """Completes one assessment through the single-page survey."""
+    def timed(route, method, path, data=None, json_body=None):
+        start = time.perf_counter()
+        status, _, content = driver.request(method, path, data, json_body)
+        timings.append((route, time.perf_counter() - start))
+        if status >= 400:
+            raise RuntimeError(f"{method} {path} returned {status}")
+        return content
+
+    timed('index', 'GET', f'/?lang={lang}')
+    timed('survey page GET', 'GET', f'/survey?lang={lang}')
+    # A browser fetches the definition once and then serves it from its cache.
+    definition = json.loads(timed('definition GET', 'GET', f'/survey.json?v={survey.name}&fp={survey.fingerprint}'))
+    answers = {question['key']: option for level in definition['levels'] for question in level['questions']}
+    result = json.loads(timed('score POST', 'POST', '/score', json_body={'v': survey.name, 'lang': lang,
+                                                                         'answers': answers}))
+    timed('final POST', 'POST', f'/final?lang={lang}', {'state': result['state'], 'email': 'benchmark@example.com'})
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[rank]
+
+
+def summarize(timings, wall_seconds):
+    by_route = {route: [] for route in ROUTES}
+    for route, seconds in timings:
+        by_route[route].append(seconds)
+    report = {}
+    for route, values in by_route.items():
+        if not values:
+            continue
+        values.sort()
+        report[route] = {
+            'count': len(values),
+            'mean_ms': round(sum(values) / len(values) * 1000, 3),
+            'p50_ms': round(percentile(values, 50) * 1000, 3),
+            'p95_ms': round(percentile(values, 95) * 1000, 3),
+            'p99_ms': round(percentile(values, 99) * 1000, 3),
+            # this route's share of the overall throughput
+            'rps': round(len(values) / wall_seconds, 1) if wall_seconds else 0.0,
+        }
+    report['total'] = {'count': len(timings), 'wall_seconds': round(wall_seconds, 3),
+                       'rps': round(len(timings) / wall_seconds, 1) if wall_seconds else 0.0}
+    return report
+
+
+class CPUProbe:
+    """Wraps ``(module, name)`` functions and accumulates the thread CPU time spent in them."""
+
+    def __init__(self, *targets):
+        self.calls = 0
+        self.cpu_seconds = 0.0
+        self._lock = threading.Lock()
+        for module, name in targets:
+            setattr(module, name, self._wrap(getattr(module, name)))
+
+    def _wrap(self, original):
+        def probe(*args, **kwargs):
+            start = time.thread_time()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                elapsed = time.thread_time() - start
+                with self._lock:
+                    self.calls += 1
+                    self.cpu_seconds += elapsed
+
+        return probe
+
+    def report(self):
+        return {'calls': self.calls, 'cpu_seconds': round(self.cpu_seconds, 6),
+                'us_per_call': round(self.cpu_seconds / self.calls * 1e6, 2) if self.calls else 0.0}
+
+
+def wait_for_delivery(smtp, expected, timeout):
+    deadline = time.monotonic() + timeout
+    while smtp.messages < expected and time.monotonic() < deadline:
+        time.sleep(0.05)
+    return smtp.messages
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the survey funnel.")
+    parser.add_argument('--iterations', type=int, default=200, help="completed assessments to run")
+    parser.add_argument('--concurrency', type=int, default=1, help="parallel funnels (HTTP mode)")
+    parser.add_argument('--warmup', type=int, default=5, help="untimed assessments before measuring")
+    parser.add_argument('--url', help="benchmark a running server instead of the in-process app")
+    parser.add_argument('--smtp-port', type=int, default=0, help="port for the fake SMTP server")
+    parser.add_argument('--delivery-timeout', type=float, default=30, help="seconds to wait for queued emails")
+    parser.add_argument('--single-page', action='store_true', help="use the single-page survey and /score")
+    parser.add_argument('-o', '--output', help="write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    smtp = FakeSMTPServer(port=args.smtp_port).start()
+    # The app logs to stdout; keep it clear for the report.
+    with contextlib.redirect_stdout(sys.stderr):
+        report = run(args, smtp)
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+    smtp.shutdown()
+
+
+def run(args, smtp):
+    probes = {}
+    if args.url:
+        from app import surveys
+        survey = surveys.get()
+        driver = HTTPDriver(args.url)
+    else:
+        # keep the benchmark's results, emails and counters out of the real data files
+        data_dir = tempfile.mkdtemp(prefix='survey_benchmark_')
+        os.environ.update(MAIL_SERVER='127.0.0.1', MAIL_PORT=str(smtp.port), MAIL_USE_SSL='false',
+                          MAIL_SENDER='benchmark@localhost', MAIL_USERNAME='', MAIL_PASSWORD='',
+                          MAIL_QUEUE_PATH=os.path.join(data_dir, 'mail_queue.db'),
+                          RESULTS_PATH=os.path.join(data_dir, 'results.log'),
+                          ANALYTICS_PATH=os.path.join(data_dir, 'analytics.db'),
+                          ADMISSION_DIR=os.path.join(data_dir, 'admission'),
+                          METRICS_DIR=os.path.join(data_dir, 'metrics'),
+                          # every funnel comes from one client; keep the admission checks but never reject
+                          RATE_LIMIT_REQUESTS='1000000/second', RATE_LIMIT_EMAILS_PER_IP='1000000/second',
+                          RATE_LIMIT_EMAILS_PER_RECIPIENT='1000000/second')
+        import app
+        import render_cache
+        survey = app.surveys.get()
+        driver = TestClientDriver(app.app)
+        probes['scoring'] = CPUProbe((app, 'calculate_state_maturity'))
+        # cached pages and emails render through render_cache, the index and thanks pages directly
+        probes['template_rendering'] = CPUProbe((render_cache, 'render_template'), (app, 'render_template'))
+
+    funnel = run_single_page if args.single_page else run_funnel
+    for _ in range(args.warmup):
+        funnel(driver, survey, [])
+    warmup_messages = wait_for_delivery(smtp, args.warmup, args.delivery_timeout)
+    for probe in probes.values():
+        probe.calls, probe.cpu_seconds = 0, 0.0
+
+    timings = []
+    options = survey.option_letters
+    start = time.perf_counter()
+    if args.concurrency > 1:
+        with ThreadPoolExecutor(args.concurrency) as pool:
+            for future in [pool.submit(funnel, driver, survey, timings, options[i % len(options)])
+                           for i in range(args.iterations)]:
+                future.result()
+    else:
+        for i in range(args.iterations):
+            funnel(driver, survey, timings, options[i % len(options)])
+    wall = time.perf_counter() - start
+    delivered = wait_for_delivery(smtp, warmup_messages + args.iterations, args.delivery_timeout)
+
+    return {
+        'commit': git_commit(),
+        'mode': 'http' if args.url else 'in-process',
+        'funnel': 'single-page' if args.single_page else 'multi-page',
+        'iterations': args.iterations,
+        'concurrency': args.concurrency,
+        'routes': summarize(timings, wall),
+        'cpu': {name: probe.report() for name, probe in probes.items()},
+        'emails': {'queued': args.iterations, 'delivered': delivered - warmup_messages},
+    }
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,27 @@
+"""Blocking disk and database work under gevent workers.
+
+With SERVER_MODE=async every gunicorn worker runs on one gevent event loop and
+the app's background threads are greenlets on that loop too. A call that blocks
+in C, such as fsync(), an SQLite write waiting for another process's lock or a
+blocking flock(), stalls every request of the worker until it returns. call()
+runs such work on gevent's pool of real OS threads and lets the loop carry on;
+in sync workers it just calls the function.
+
+Code handed to call() runs outside the event loop, so it must not take gevent
+locks, conditions or queues (e.g. the module-level locks of results_store).
+"""
+try:
+    from gevent import get_hub, monkey
+except ImportError:
+    monkey = None
+
+
+def _patched():
+    return monkey is not None and monkey.is_module_patched('threading')
+
+
+def call(fn, *args, **kwargs):
+    """Returns ``fn(*args, **kwargs)``, run on a real thread when the worker is gevent-patched."""
+    if _patched():
+        return get_hub().threadpool.apply(fn, args, kwargs)
+    return fn(*args, **kwargs)
@@ -0,0 +1,186 @@
+"""Send result emails to many recipients in one run.
+
+Reads a JSONL or CSV file with an ``email`` column and either a ``state``
+token or a legacy ``answers`` string per row. Each distinct result body is
+rendered once, messages are sent over a single authenticated SMTP session
+(reopened every --per-session messages) at a bounded rate, and every
+delivered row is appended to a progress log so an interrupted run can be
+resumed by starting it again with the same --progress file. With --bcc-digest
+the digest lists every delivered row of the progress log that no earlier
+digest covered, and is marked in the log once it has been sent.
+
+    python bulk_email.py workshop.csv --progress workshop.progress --rate 5 --bcc-digest
+"""
+import argparse
+import csv
+import json
+import os
+import smtplib
+import sys
+import time
+from email.errors import MessageError
+from html import escape
+
+import mailer
+from answer_state import decode_state
+from app import RESULT_EMAIL_SUBJECT, app, calculate_state_maturity, parse_answers, render_result_email, surveys
+
+
+def read_rows(path):
+    """Yields ``(row number, record dict)`` from a JSONL or CSV file."""
+    with open(path, newline='', encoding='utf-8') as f:
+        if path.endswith('.csv'):
+            yield from enumerate(csv.DictReader(f))
+        else:
+            row = 0
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield row, json.loads(line)
+                    row += 1
+
+
+def row_state(record):
+    """Returns ``(survey, state)`` of a row; legacy answers strings belong to the default survey."""
+    if record.get('state'):
+        version_id, state = decode_state(record['state'], app.secret_key)
+        survey = surveys.by_id(version_id)
+        if survey is not None and survey.valid_state(state):
+            return survey, state
+    survey = surveys.get()
+    return survey, survey.pack(parse_answers(record.get('answers', '')))
+
+
+def load_progress(path):
+    """Reads the progress log.
+
+    Returns the keys of rows already delivered and the ``(email, level, total)``
+    of those delivered since the last digest was sent.
+    """
+    done = set()
+    undigested = []
+    if path and os.path.exists(path):
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # torn last line of an interrupted run
+                if entry.get('digest'):
+                    undigested = []
+                    continue
+                done.add(entry['key'])
+                undigested.append((entry['email'], entry['final_level'], entry.get('total_score', '')))
+    return done, undigested
+
+
+class RateLimiter:
+    def __init__(self, per_second):
+        self.interval = 1 / per_second if per_second > 0 else 0
+        self.next_slot = time.monotonic()
+
+    def wait(self):
+        now = time.monotonic()
+        if self.next_slot > now:
+            time.sleep(self.next_slot - now)
+        self.next_slot = max(now, self.next_slot) + self.interval
+
+
+def digest_html(sent):
+    rows = ''.join(f'<tr><td>{escape(email)}</td><td>{escape(level)}</td><td>{total}</td></tr>'
+                   for email, level, total in sent)
+    return (f'<p>{len(sent)} assessment results were sent.</p>'
+            f'<table border="1" cellpadding="4"><tr><th>Email</th><th>Level</th><th>Total Score</th></tr>'
+            f'{rows}</table>')
+
+
+def send_bulk(path, progress_path=None, rate=5.0, per_session=100, bcc_email=None, bcc_digest=False):
+    """Sends every row of ``path`` that the progress log does not list yet; returns (sent, failed)."""
+    done, digest = load_progress(progress_path)
+    progress = open(progress_path, 'a', encoding='utf-8') if progress_path else None
+    limiter = RateLimiter(rate)
+    session = mailer.SMTPSession()
+    sender = session.settings['sender']
+    messages = {}
+    sent = failed = 0
+    per_message_bcc = None if bcc_digest else bcc_email
+    try:
+        with app.test_request_context():
+            for row, record in read_rows(path):
+                email = (record.get('email') or '').strip()
+                key = f'{row}:{email}'
+                if not email or key in done:
+                    continue
+                if mailer.normalize_address(email) is None:
+                    print(f"Skipping row {row}: invalid email address {email!r}", file=sys.stderr)
+                    failed += 1
+                    continue
+                survey, state = row_state(record)
+                final_level, level_scores = calculate_state_maturity(state, survey)
+                # One MIME message per distinct result; only the recipient changes between rows.
+                body_key = (survey.name, final_level, tuple(level_scores.values()))
+                msg = messages.get(body_key)
+                if msg is None:
+                    msg, _ = mailer.build_message(sender, email, RESULT_EMAIL_SUBJECT,
+                                                  render_result_email(final_level, level_scores, survey),
+                                                  per_message_bcc)
+                    messages[body_key] = msg
+                recipients = [email, per_message_bcc] if per_message_bcc else [email]
+                if sent and sent % per_session == 0:
+                    session.close()
+                limiter.wait()
+                try:
+                    msg.replace_header('To', email)
+                    session.send(msg, recipients)
+                except (smtplib.SMTPException, OSError, UnicodeError, MessageError, ValueError) as e:
+                    print(f"Error sending email to {email}: {e}", file=sys.stderr)
+                    session.close()
+                    failed += 1
+                    continue
+                sent += 1
+                total = sum(level_scores.values())
+                digest.append((email, final_level, total))
+                if progress is not None:
+                    progress.write(json.dumps({'key': key, 'email': email, 'final_level': final_level,
+                                               'total_score': total}) + '\n')
+                    progress.flush()
+
+        if bcc_digest and bcc_email and digest:
+            try:
+                msg, recipients = mailer.build_message(sender, bcc_email, f"{RESULT_EMAIL_SUBJECT} - digest",
+                                                       digest_html(digest))
+                session.send(msg, recipients)
+            except (smtplib.SMTPException, OSError, UnicodeError, MessageError, ValueError) as e:
+                # not marked as sent, so the next run with the same --progress file sends it again
+                print(f"Error sending digest to {bcc_email}: {e}", file=sys.stderr)
+                failed += 1
+            else:
+                if progress is not None:
+                    progress.write(json.dumps({'digest': True, 'rows': len(digest)}) + '\n')
+                    progress.flush()
+    finally:
+        session.close()
+        if progress is not None:
+            progress.close()
+    return sent, failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Email stored assessment results in bulk.")
+    parser.add_argument('input', help="JSONL or CSV with 'email' and 'state' or 'answers' per row")
+    parser.add_argument('--progress', help="progress log used to skip rows already sent when resuming")
+    parser.add_argument('--rate', type=float, default=5.0, help="maximum messages per second")
+    parser.add_argument('--per-session', type=int, default=100, help="messages sent before reconnecting")
+    parser.add_argument('--bcc-digest', action='store_true',
+                        help="send BCC_EMAIL one summary message instead of a copy of every result")
+    args = parser.parse_args(argv)
+
+    sent, failed = send_bulk(args.input, args.progress, args.rate, args.per_session,
+                             os.environ.get('BCC_EMAIL'), args.bcc_digest)
+    print(f"{sent} emails sent, {failed} failed")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""A minimal local SMTP server that accepts and counts every message.
+
+Stand-in for the real mail provider in benchmarks and local runs:
+
+    python fake_smtp.py --port 8025
+    MAIL_SERVER=127.0.0.1 MAIL_PORT=8025 MAIL_USE_SSL=false gunicorn app:app
+"""
+import argparse
+import socketserver
+import threading
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(line.encode('ascii') + b'\r\n')
+
+    def handle(self):
+        self.server.connected()
+        self.reply('220 fake-smtp ready')
+        recipients = []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode('ascii', 'replace').strip()
+            verb = command[:4].upper()
+            if verb in ('EHLO', 'HELO'):
+                self.reply('250 fake-smtp')
+            elif verb == 'MAIL':
+                recipients = []
+                self.reply('250 OK')
+            elif verb == 'RCPT':
+                recipients.append(command.partition(':')[2].strip(' <>'))
+                self.reply('250 OK')
+            elif verb == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                size = 0
+                for data_line in self.rfile:
+                    if data_line in (b'.\r\n', b'.\n'):
+                        break
+                    size += len(data_line)
+                self.server.record(recipients, size)
+                self.reply('250 OK')
+            elif verb == 'QUIT':
+                self.reply('221 Bye')
+                return
+            elif verb in ('RSET', 'NOOP', 'AUTH'):
+                self.reply('235 OK' if verb == 'AUTH' else '250 OK')
+            else:
+                self.reply('502 Command not implemented')
+
+
+class FakeSMTPServer(socketserver.ThreadingTCPServer):
+    """Accepts SMTP sessions on ``(host, port)`` and counts sessions, delivered messages and recipients."""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host='127.0.0.1', port=0):
+        super().__init__((host, port), _Handler)
+        self.sessions = 0
+        self.messages = 0
+        self.recipients = 0
+        self.bytes = 0
+        self._lock = threading.Lock()
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def connected(self):
+        with self._lock:
+            self.sessions += 1
+
+    def record(self, recipients, size):
+        with self._lock:
+            self.messages += 1
+            self.recipients += len(recipients)
+            self.bytes += size
+
+    def start(self):
+        """Serves in a daemon thread and returns self."""
+        threading.Thread(target=self.serve_forever, name='fake-smtp', daemon=True).start()
+        return self
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run a local SMTP server that accepts every message.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8025)
+    args = parser.parse_args()
+    server = FakeSMTPServer(args.host, args.port)
+    print(f"Fake SMTP server listening on {args.host}:{server.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(f"{server.messages} messages received")
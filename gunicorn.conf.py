@@ -0,0 +1,51 @@
+"""Gunicorn settings.
+
+SERVER_MODE selects how requests are served:
+
+* ``sync`` (default): classic pre-fork workers, one request per process at a time.
+* ``async``: gevent event-loop workers. Socket I/O, including the SMTP sessions of
+  the mail delivery workers, yields to the loop instead of blocking, so a single
+  process can hold hundreds of concurrent survey sessions.
+
+  Disk and database calls do not yield. The ones that can wait on another process
+  (the results log's flock + fsync, SQLite writes to the rate limit buckets, the
+  mail queue and the analytics aggregates, and analytics queries) run on gevent's
+  thread pool through blocking.call(). What is left on the loop is short: slot
+  waits in admission.SlotPool poll with non-blocking flocks and a patched sleep,
+  and the metrics snapshots and survey reloads are small file reads and writes
+  without fsync.
+"""
+import os
+
+SERVER_MODE = os.environ.get('SERVER_MODE', 'sync').lower()
+
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+
+if SERVER_MODE == 'async':
+    worker_class = 'gevent'
+    worker_connections = int(os.environ.get('WORKER_CONNECTIONS', 500))
+elif SERVER_MODE == 'sync':
+    worker_class = 'sync'
+else:
+    raise ValueError(f"Unknown SERVER_MODE {SERVER_MODE!r}, expected 'sync' or 'async'")
+
+
+def on_starting(server):
+    # Drop metric snapshots left behind by a previous run before workers start writing theirs.
+    import metrics
+    metrics.clear()
+
+    # Build the fingerprinted static assets once, before any worker loads the manifest.
+    import assets
+    try:
+        assets.build(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static'))
+    except OSError as e:
+        print(f"Error building static assets: {e}")
+
+
+def post_worker_init(worker):
+    # Start mail delivery as soon as a worker has loaded the app, so jobs queued
+    # before a restart or deploy go out without waiting for the first request.
+    import mailer
+    mailer.start_workers()
@@ -0,0 +1,287 @@
+"""Background delivery of result emails.
+
+Jobs are written to a small SQLite queue so they survive a worker restart, and
+a few delivery threads per process drain it over long-lived SMTP sessions.
+At most MAX_INFLIGHT messages are handed to the SMTP server at once across all
+processes.
+"""
+import os
+import re
+import smtplib
+import sqlite3
+import threading
+import time
+from email.errors import MessageError
+from email.mime.text import MIMEText
+
+import admission
+import blocking
+import metrics
+
+QUEUE_PATH = os.environ.get('MAIL_QUEUE_PATH', 'mail_queue.db')
+WORKERS = int(os.environ.get('MAIL_WORKERS', 2))
+MAX_ATTEMPTS = int(os.environ.get('MAIL_MAX_ATTEMPTS', 5))
+RETRY_BACKOFF = float(os.environ.get('MAIL_RETRY_BACKOFF', 5))
+IDLE_TIMEOUT = float(os.environ.get('MAIL_IDLE_TIMEOUT', 60))
+POLL_INTERVAL = float(os.environ.get('MAIL_POLL_INTERVAL', 1))
+MAX_INFLIGHT = int(os.environ.get('MAIL_MAX_INFLIGHT', 4))
+# A job claimed for longer than this belongs to a worker that died mid-send.
+STALE_CLAIM = 300
+
+# Plain ASCII local@domain addresses; anything else cannot be sent without SMTPUTF8 or may inject headers.
+_ADDRESS = re.compile(r"[A-Za-z0-9.!#$%&'*+/=?^_`{|}~-]+@[A-Za-z0-9-]+(?:\.[A-Za-z0-9-]+)+")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    receiver TEXT NOT NULL,
+    subject TEXT NOT NULL,
+    html TEXT NOT NULL,
+    bcc TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt REAL NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    claimed_at REAL,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (status, next_attempt);
+"""
+
+_local = threading.local()
+_wakeup = threading.Condition()
+_started_pid = None
+_start_lock = threading.Lock()
+_send_slots = admission.SlotPool('smtp', MAX_INFLIGHT)
+
+
+def _db():
+    """Returns this thread's connection to the queue database."""
+    conn = getattr(_local, 'conn', None)
+    if conn is None or _local.pid != os.getpid():
+        conn = sqlite3.connect(QUEUE_PATH, timeout=30, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.executescript(_SCHEMA)
+        _local.conn = conn
+        _local.pid = os.getpid()
+    return conn
+
+
+def smtp_settings():
+    """Reads the SMTP configuration from the environment."""
+    use_ssl = os.environ.get('MAIL_USE_SSL', 'true').lower() not in ('0', 'false', 'no')
+    return {
+        'server': os.environ.get('MAIL_SERVER'),
+        'port': int(os.environ.get('MAIL_PORT', 465 if use_ssl else 25)),
+        'username': os.environ.get('MAIL_USERNAME'),
+        'password': os.environ.get('MAIL_PASSWORD'),
+        'sender': os.environ.get('MAIL_SENDER') or os.environ.get('MAIL_USERNAME'),
+        'use_ssl': use_ssl,
+        'use_tls': os.environ.get('MAIL_USE_TLS', 'false').lower() in ('1', 'true', 'yes'),
+    }
+
+
+def check_settings(settings=None):
+    """Raises ValueError unless an SMTP server and a sender address are configured."""
+    settings = settings or smtp_settings()
+    if not settings['server'] or not settings['sender']:
+        raise ValueError("Email is not configured: set MAIL_SERVER and MAIL_SENDER (or MAIL_USERNAME)")
+
+
+def normalize_address(address):
+    """Returns ``address`` without surrounding whitespace, or None if it is not a deliverable address."""
+    address = (address or '').strip()
+    return address if _ADDRESS.fullmatch(address) else None
+
+
+def build_message(sender, receiver_email, subject, html_content, bcc_email=None):
+    """Builds the MIME message and the envelope recipients for one result email."""
+    msg = MIMEText(html_content, 'html', 'utf-8')
+    msg['Subject'] = subject
+    msg['From'] = sender
+    msg['To'] = receiver_email
+
+    # Handle multiple recipients including BCC
+    recipients = [receiver_email]
+    if bcc_email:
+        recipients.append(bcc_email)
+        msg['Bcc'] = bcc_email
+    return msg, recipients
+
+
+class SMTPSession:
+    """An authenticated SMTP connection that is kept open between messages."""
+
+    def __init__(self, settings=None):
+        self.settings = settings or smtp_settings()
+        self.server = None
+        self.last_used = 0.0
+
+    def _connect(self):
+        s = self.settings
+        if s['use_ssl']:
+            server = smtplib.SMTP_SSL(s['server'], s['port'], timeout=30)
+        else:
+            server = smtplib.SMTP(s['server'], s['port'], timeout=30)
+            if s['use_tls']:
+                server.starttls()
+        if s['username'] and s['password']:
+            server.login(s['username'], s['password'])
+        return server
+
+    def _alive(self):
+        """Whether the session can be reused; a session idle past IDLE_TIMEOUT is closed instead of probed."""
+        if self.server is not None and time.monotonic() - self.last_used > IDLE_TIMEOUT:
+            self.close()
+        return self.server is not None
+
+    def send(self, msg, recipients):
+        """Sends one message, reconnecting once if the server dropped the session."""
+        if not self._alive():
+            self.server = self._connect()
+        try:
+            self.server.sendmail(self.settings['sender'], recipients, msg.as_string())
+        except smtplib.SMTPServerDisconnected:
+            self.server = self._connect()
+            self.server.sendmail(self.settings['sender'], recipients, msg.as_string())
+        self.last_used = time.monotonic()
+
+    def close(self):
+        if self.server is not None:
+            try:
+                self.server.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self.server = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def enqueue_email(receiver_email, subject, html_content, bcc_email=None):
+    """Queues a result email for background delivery and returns its job id.
+
+    Raises ValueError if email is not configured, so the caller can report it
+    instead of queueing a message that can never be sent.
+    """
+    check_settings()
+    job_id = blocking.call(_insert, receiver_email, subject, html_content, bcc_email)
+    start_workers()
+    with _wakeup:
+        _wakeup.notify()
+    return job_id
+
+
+def _insert(receiver_email, subject, html_content, bcc_email):
+    cur = _db().execute(
+        'INSERT INTO jobs (receiver, subject, html, bcc, next_attempt) VALUES (?, ?, ?, ?, ?)',
+        (receiver_email, subject, html_content, bcc_email, time.time()))
+    return cur.lastrowid
+
+
+def _claim():
+    """Atomically takes the next ready job, or returns None."""
+    conn = _db()
+    now = time.time()
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        conn.execute("UPDATE jobs SET status = 'pending' WHERE status = 'sending' AND claimed_at < ?",
+                     (now - STALE_CLAIM,))
+        row = conn.execute(
+            "SELECT id, receiver, subject, html, bcc, attempts FROM jobs "
+            "WHERE status = 'pending' AND next_attempt <= ? ORDER BY id LIMIT 1", (now,)).fetchone()
+        if row is not None:
+            conn.execute("UPDATE jobs SET status = 'sending', claimed_at = ? WHERE id = ?", (now, row[0]))
+        conn.execute('COMMIT')
+    except sqlite3.Error:
+        conn.execute('ROLLBACK')
+        raise
+    return row
+
+
+def _finish(job_id, attempts, error=None, permanent=False):
+    conn = _db()
+    if error is None:
+        conn.execute('DELETE FROM jobs WHERE id = ?', (job_id,))
+    elif permanent or attempts >= MAX_ATTEMPTS:
+        conn.execute("UPDATE jobs SET status = 'failed', attempts = ?, error = ? WHERE id = ?",
+                     (attempts, error, job_id))
+    else:
+        delay = RETRY_BACKOFF * 2 ** (attempts - 1)
+        conn.execute("UPDATE jobs SET status = 'pending', attempts = ?, error = ?, next_attempt = ? "
+                     "WHERE id = ?", (attempts, error, time.time() + delay, job_id))
+
+
+def _deliver(session, job):
+    """Sends one claimed job and records the outcome in the queue; never raises."""
+    job_id, receiver, subject, html, bcc, attempts = job
+    error = None
+    permanent = False
+    try:
+        msg, recipients = build_message(session.settings['sender'], receiver, subject, html, bcc)
+        with _send_slots.hold():
+            start = time.perf_counter()
+            session.send(msg, recipients)
+    except smtplib.SMTPRecipientsRefused as e:
+        error, permanent, reason = e, True, 'refused'
+    except (UnicodeError, MessageError, ValueError) as e:
+        # The address or headers cannot be encoded; retrying would fail the same way.
+        error, permanent, reason = e, True, 'invalid'
+        session.close()
+    except Exception as e:
+        # SMTP and network errors, but also anything unexpected (e.g. a bad configuration):
+        # retried with backoff until MAX_ATTEMPTS, and the delivery thread keeps running.
+        error, reason = e, type(e).__name__
+        session.close()
+
+    if error is None:
+        print("Email sent successfully!")
+        metrics.observe('survey_smtp_send_duration_seconds', time.perf_counter() - start)
+        metrics.inc('survey_smtp_sent_total')
+    else:
+        print(f"Error sending email: {error}")
+        metrics.inc('survey_smtp_send_failures_total', reason=reason)
+    try:
+        blocking.call(_finish, job_id, attempts + 1, None if error is None else str(error), permanent)
+    except sqlite3.Error as e:
+        # The job stays claimed and is picked up again after STALE_CLAIM.
+        print(f"Error updating mail queue: {e}")
+
+
+def _worker():
+    session = SMTPSession()
+    while True:
+        try:
+            job = blocking.call(_claim)
+        except sqlite3.Error as e:
+            print(f"Error reading mail queue: {e}")
+            job = None
+        if job is None:
+            with _wakeup:
+                _wakeup.wait(POLL_INTERVAL)
+            if session.server is not None and time.monotonic() - session.last_used > IDLE_TIMEOUT:
+                session.close()
+            continue
+        _deliver(session, job)
+
+
+def start_workers():
+    """Starts the delivery threads once per process (safe to call after fork)."""
+    global _started_pid
+    if _started_pid == os.getpid():
+        return
+    with _start_lock:
+        if _started_pid == os.getpid():
+            return
+        _started_pid = os.getpid()
+        try:
+            check_settings()
+        except ValueError as e:
+            # queued jobs wait for a correctly configured process rather than failing here
+            print(f"Error starting mail delivery: {e}")
+            return
+        for _ in range(WORKERS):
+            threading.Thread(target=_worker, name='mailer', daemon=True).start()
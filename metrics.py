@@ -0,0 +1,202 @@
+"""Prometheus-style metrics shared across gunicorn workers.
+
+Each process keeps its counters and histograms in memory and writes a snapshot
+to METRICS_DIR/<pid>.json at most once per FLUSH_INTERVAL. The /metrics
+endpoint merges the snapshots of every worker into the text exposition format.
+Counters of workers that have exited are kept so totals never go backwards;
+gauges are only reported for live processes.
+"""
+import atexit
+import json
+import os
+import tempfile
+import threading
+import time
+
+METRICS_DIR = os.environ.get('METRICS_DIR', os.path.join(tempfile.gettempdir(), 'survey_metrics'))
+FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', 1))
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# name -> (type, help)
+METRICS = {
+    'survey_http_request_duration_seconds': ('histogram', 'Time spent handling a request, by endpoint.'),
+    'survey_completed_total': ('counter', 'Completed assessments by final level and language.'),
+    'survey_smtp_send_duration_seconds': ('histogram', 'Time spent handing one email to the SMTP server.'),
+    'survey_smtp_sent_total': ('counter', 'Emails accepted by the SMTP server.'),
+    'survey_smtp_send_failures_total': ('counter', 'Failed SMTP send attempts.'),
+    'survey_render_cache_hits_total': ('counter', 'Render cache lookups served from memory.'),
+    'survey_render_cache_misses_total': ('counter', 'Render cache lookups that rendered the template.'),
+    'survey_render_cache_entries': ('gauge', 'Pages currently held in the render cache.'),
+    'survey_rate_limited_total': ('counter', 'Requests rejected with 429 by admission control.'),
+}
+
+_counters = {}
+_histograms = {}
+_collectors = []
+_lock = threading.Lock()
+_flusher_pid = None
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def inc(name, value=1, **labels):
+    """Adds ``value`` to a counter."""
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+    _ensure_flusher()
+
+
+def observe(name, value, **labels):
+    """Records one observation in a histogram."""
+    key = _key(name, labels)
+    with _lock:
+        hist = _histograms.get(key)
+        if hist is None:
+            hist = _histograms[key] = [0] * (len(LATENCY_BUCKETS) + 2)
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if value <= bound:
+                hist[i] += 1
+                break
+        hist[-2] += value
+        hist[-1] += 1
+    _ensure_flusher()
+
+
+def register_collector(collect):
+    """Registers a callable returning ``(name, labels, value)`` samples read at snapshot time."""
+    _collectors.append(collect)
+
+
+def _snapshot():
+    with _lock:
+        counters = [[name, dict(labels), value] for (name, labels), value in _counters.items()]
+        histograms = [[name, dict(labels), list(hist)] for (name, labels), hist in _histograms.items()]
+    gauges = []
+    for collect in _collectors:
+        for name, labels, value in collect():
+            target = gauges if METRICS[name][0] == 'gauge' else counters
+            target.append([name, labels, value])
+    return {'counters': counters, 'histograms': histograms, 'gauges': gauges}
+
+
+def flush():
+    """Writes this process's snapshot atomically."""
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    path = os.path.join(METRICS_DIR, f'{os.getpid()}.json')
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(_snapshot(), f)
+    os.replace(tmp, path)
+
+
+def _flush_loop():
+    while True:
+        time.sleep(FLUSH_INTERVAL)
+        try:
+            flush()
+        except OSError as e:
+            print(f"Error writing metrics: {e}")
+
+
+def _ensure_flusher():
+    global _flusher_pid
+    if _flusher_pid == os.getpid():
+        return
+    with _lock:
+        if _flusher_pid == os.getpid():
+            return
+        threading.Thread(target=_flush_loop, name='metrics', daemon=True).start()
+        if _flusher_pid is None:
+            atexit.register(_flush_at_exit)
+        _flusher_pid = os.getpid()
+
+
+def _flush_at_exit():
+    try:
+        flush()
+    except OSError:
+        pass
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _label_str(labels, extra=None):
+    items = sorted(labels.items())
+    if extra:
+        items.append(extra)
+    if not items:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in items) + '}'
+
+
+def clear():
+    """Removes the snapshots of previous runs; call once before the workers start."""
+    if os.path.isdir(METRICS_DIR):
+        for filename in os.listdir(METRICS_DIR):
+            if filename.endswith('.json'):
+                os.remove(os.path.join(METRICS_DIR, filename))
+
+
+def render():
+    """Merges every worker's snapshot and returns the text exposition format."""
+    flush()
+    counters, gauges, histograms = {}, {}, {}
+    for filename in os.listdir(METRICS_DIR):
+        if not filename.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(METRICS_DIR, filename)) as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            continue
+        for name, labels, value in snapshot['counters']:
+            key = _key(name, labels)
+            counters[key] = counters.get(key, 0) + value
+        if _alive(int(filename[:-5])):
+            for name, labels, value in snapshot['gauges']:
+                key = _key(name, labels)
+                gauges[key] = gauges.get(key, 0) + value
+        for name, labels, hist in snapshot['histograms']:
+            key = _key(name, labels)
+            merged = histograms.setdefault(key, [0] * len(hist))
+            for i, value in enumerate(hist):
+                merged[i] += value
+
+    lines = []
+    for name, (kind, help_text) in METRICS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        if kind == 'histogram':
+            for (metric, labels), hist in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                labels = dict(labels)
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS, hist):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{_label_str(labels, ("le", bound))} {cumulative}')
+                lines.append(f'{name}_bucket{_label_str(labels, ("le", "+Inf"))} {hist[-1]}')
+                lines.append(f'{name}_sum{_label_str(labels)} {hist[-2]}')
+                lines.append(f'{name}_count{_label_str(labels)} {hist[-1]}')
+        else:
+            samples = counters if kind == 'counter' else gauges
+            for (metric, labels), value in sorted(samples.items()):
+                if metric == name:
+                    lines.append(f'{name}{_label_str(dict(labels))} {value}')
+    return '\n'.join(lines) + '\n'
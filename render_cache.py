@@ -0,0 +1,86 @@
+"""Bounded LRU cache of rendered templates.
+
+Pages whose output depends only on a small key (level and language, or the
+final level and score breakdown) are rendered once per key and then served
+from memory. When any file in the template directory changes (including
+imported macros) the cached pages and Jinja's compiled templates are dropped,
+since Jinja itself does not re-check files unless TEMPLATES_AUTO_RELOAD is set.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app, render_template, request
+
+# Stand-in for per-visitor values that are substituted into a cached page after lookup.
+STATE_PLACEHOLDER = '__survey_state__'
+
+
+class RenderCache:
+    def __init__(self, template_dir, maxsize=1024, check_interval=1.0):
+        self.template_dir = template_dir
+        self.maxsize = maxsize
+        self.check_interval = check_interval
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        # (name, mtime, size) of every template file, and when it was last scanned
+        self._version = None
+        self._checked = None
+        self._lock = threading.Lock()
+
+    def _scan(self):
+        try:
+            return tuple(sorted((entry.name, entry.stat().st_mtime_ns, entry.stat().st_size)
+                                for entry in os.scandir(self.template_dir) if entry.is_file()))
+        except OSError:
+            return None
+
+    def refresh(self):
+        """Re-scans the templates at most once per check_interval; drops everything rendered if they changed.
+
+        Needs an app context. Returns the current template version.
+        """
+        now = time.monotonic()
+        if self._checked is not None and now - self._checked < self.check_interval:
+            return self._version
+        version = self._scan()
+        with self._lock:
+            changed = self._checked is not None and version != self._version
+            self._checked = now
+            self._version = version
+            if changed:
+                self._entries.clear()
+        if changed and current_app.jinja_env.cache is not None:
+            current_app.jinja_env.cache.clear()
+        return version
+
+    def render(self, template_name, key, **context):
+        """Renders ``template_name``, reusing the output of an earlier call with the same key."""
+        version = self.refresh()
+        cache_key = (template_name, request.script_root, key)
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(cache_key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        html = render_template(template_name, **context)
+        with self._lock:
+            self._entries[cache_key] = (version, html)
+            self._entries.move_to_end(cache_key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return html
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self._entries), 'maxsize': self.maxsize}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._checked = None
@@ -0,0 +1,186 @@
+"""Append-only local log of submitted assessments.
+
+Every submission is one fixed-size 20 byte record:
+
+    uint32  unix timestamp
+    uint64  packed answer state (2 bits per question, see survey_model)
+    5 x u8  points per level, in level order (zero for unused slots)
+    uint8   final level position
+    uint8   language (index into LANGS, 255 for anything else)
+    uint8   survey version
+
+Records are buffered in memory and group-committed by a background thread,
+one write() + fsync() per batch, so the request path never waits on the disk.
+Commit listeners (e.g. the analytics aggregates) see each batch once written;
+they run through blocking.call() and so must not take this module's locks.
+Workers append to the same file under an flock. load() maps the whole log
+into a NumPy structured array for fast scans.
+"""
+import atexit
+import fcntl
+import os
+import struct
+import threading
+import time
+
+import blocking
+
+RESULTS_PATH = os.environ.get('RESULTS_PATH', 'results.log')
+FLUSH_INTERVAL = float(os.environ.get('RESULTS_FLUSH_INTERVAL', 0.5))
+FLUSH_ROWS = int(os.environ.get('RESULTS_FLUSH_ROWS', 512))
+
+MAGIC = b'SURVRES1'
+HEADER = struct.Struct('<8sII')  # magic, record size, reserved
+RECORD = struct.Struct('<IQ5BBBB')
+LEVEL_SLOTS = 5
+LANGS = ('en', 'ar')
+OTHER_LANG = 255
+
+_buffer = []
+_listeners = []
+_lock = threading.Lock()
+_wakeup = threading.Condition(_lock)
+_flusher_pid = None
+
+
+def pack_record(timestamp, state, level_scores, final_level, lang, version=0):
+    """Packs one submission; ``level_scores`` are the per-level points in order."""
+    if len(level_scores) > LEVEL_SLOTS:
+        raise ValueError(f"Result records hold at most {LEVEL_SLOTS} level scores")
+    padding = (0,) * (LEVEL_SLOTS - len(level_scores))
+    lang_code = LANGS.index(lang) if lang in LANGS else OTHER_LANG
+    return RECORD.pack(int(timestamp), state, *level_scores, *padding, final_level, lang_code, version)
+
+
+def unpack_record(data):
+    """Returns ``(timestamp, state, level_scores, final_level, lang, version)``."""
+    timestamp, state, *rest = RECORD.unpack(data)
+    level_scores = tuple(rest[:LEVEL_SLOTS])
+    final_level, lang_code, version = rest[LEVEL_SLOTS:]
+    lang = LANGS[lang_code] if lang_code < len(LANGS) else None
+    return timestamp, state, level_scores, final_level, lang, version
+
+
+def record(state, level_scores, final_level, lang, version=0, timestamp=None):
+    """Buffers one submission for the next group commit."""
+    data = pack_record(time.time() if timestamp is None else timestamp, state, level_scores, final_level, lang,
+                       version)
+    _ensure_flusher()
+    with _lock:
+        _buffer.append(data)
+        if len(_buffer) >= FLUSH_ROWS:
+            _wakeup.notify()
+
+
+def add_commit_listener(callback):
+    """Calls ``callback(records)`` with the unpacked records of every committed batch."""
+    _listeners.append(callback)
+
+
+def _write(path, data):
+    fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        size = os.fstat(fd).st_size
+        if size == 0:
+            data = HEADER.pack(MAGIC, RECORD.size, 0) + data
+        try:
+            view = memoryview(data)
+            while view:
+                view = view[os.write(fd, view):]
+            os.fsync(fd)
+        except OSError:
+            # leave no partial batch behind, the caller retries all of it
+            os.ftruncate(fd, size)
+            raise
+    finally:
+        os.close(fd)
+
+
+def flush():
+    """Writes out everything buffered so far and returns the number of records written.
+
+    If the write fails the records go back to the front of the buffer for the next flush.
+    """
+    with _lock:
+        if not _buffer:
+            return 0
+        batch = _buffer[:]
+        _buffer.clear()
+    data = b''.join(batch)
+    try:
+        blocking.call(_write, RESULTS_PATH, data)
+    except OSError:
+        with _lock:
+            _buffer[:0] = batch
+        raise
+    if _listeners:
+        records = [unpack_record(data[offset:offset + RECORD.size]) for offset in range(0, len(data), RECORD.size)]
+        for callback in _listeners:
+            try:
+                blocking.call(callback, records)
+            except Exception as e:
+                print(f"Error in results commit listener: {e}")
+    return len(data) // RECORD.size
+
+
+def _flush_loop():
+    while True:
+        with _lock:
+            _wakeup.wait(FLUSH_INTERVAL)
+        try:
+            flush()
+        except OSError as e:
+            print(f"Error writing results: {e}")
+
+
+def _ensure_flusher():
+    global _flusher_pid
+    if _flusher_pid == os.getpid():
+        return
+    with _lock:
+        if _flusher_pid == os.getpid():
+            return
+        # A forked worker must not re-commit rows buffered by its parent.
+        _buffer.clear()
+        threading.Thread(target=_flush_loop, name='results', daemon=True).start()
+        if _flusher_pid is None:
+            atexit.register(flush)
+        _flusher_pid = os.getpid()
+
+
+def _check_header(f, path):
+    header = f.read(HEADER.size)
+    if not header:
+        return False
+    magic, record_size, _ = HEADER.unpack(header)
+    if magic != MAGIC or record_size != RECORD.size:
+        raise ValueError(f"{path} is not a results log")
+    return True
+
+
+def iter_records(path=RESULTS_PATH, chunk_records=65536):
+    """Yields the unpacked records of a results log in append order."""
+    with open(path, 'rb') as f:
+        if not _check_header(f, path):
+            return
+        while True:
+            chunk = f.read(RECORD.size * chunk_records)
+            if not chunk:
+                return
+            for offset in range(0, len(chunk) - len(chunk) % RECORD.size, RECORD.size):
+                yield unpack_record(chunk[offset:offset + RECORD.size])
+
+
+def load(path=RESULTS_PATH):
+    """Memory-maps a results log as a NumPy structured array (no copy)."""
+    import numpy as np
+
+    dtype = np.dtype([('timestamp', '<u4'), ('state', '<u8'), ('level_scores', 'u1', (LEVEL_SLOTS,)),
+                      ('final_level', 'u1'), ('lang', 'u1'), ('version', 'u1')])
+    with open(path, 'rb') as f:
+        has_header = _check_header(f, path)
+    count = (os.path.getsize(path) - HEADER.size) // RECORD.size if has_header else 0
+    if count == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode='r', offset=HEADER.size, shape=(count,))
@@ -0,0 +1,180 @@
+"""Survey definitions loaded from surveys/*.json, with hot reload.
+
+Every ``surveys/<name>.json`` file is one version of the survey; all of them
+are served side by side and picked by name (``?v=<name>`` on the first page)
+or by the version id carried in the answer token. A compiled copy of each
+definition is pickled to surveys/.cache, keyed by a hash of the JSON, so a
+worker starting up only unpickles it.
+
+A background thread polls the files' modification times. A changed file is
+compiled off the request path and swapped in with a single assignment; if it
+fails to validate the previous version keeps being served. Answer tokens and
+stored results only carry the version id, so a definition that changes the
+levels, questions or options under an id it was already served with is
+rejected: such a change needs a new "id".
+"""
+import glob
+import hashlib
+import json
+import os
+import pickle
+import threading
+import time
+
+import results_store
+from survey_model import compile_survey
+
+SURVEYS_DIR = os.environ.get('SURVEYS_DIR', 'surveys')
+DEFAULT_SURVEY = os.environ.get('SURVEY_VERSION', 'default')
+POLL_INTERVAL = float(os.environ.get('SURVEY_POLL_INTERVAL', 2))
+CACHE_DIR = '.cache'
+# Bump when the compiled form changes so old pickles are ignored.
+CACHE_FORMAT = 1
+
+
+class SurveyRegistry:
+    """All loaded survey versions, by file name and by version id."""
+
+    def __init__(self, directory=SURVEYS_DIR, default=DEFAULT_SURVEY, cache_dir=None,
+                 poll_interval=POLL_INTERVAL):
+        self.directory = directory
+        self.default = default
+        self.cache_dir = cache_dir or os.path.join(directory, CACHE_DIR)
+        self.poll_interval = poll_interval
+        # name -> (mtime_ns, size) of the file each loaded version came from
+        self._sources = {}
+        # name -> (mtime_ns, size) of definition files that failed to load, so each error is reported once
+        self._failed = {}
+        # (by name, by version id); replaced as a whole so readers never see a partial reload
+        self._versions = ({}, {})
+        self._reload_lock = threading.Lock()
+        self._poller_pid = None
+        self.reload()
+        if default not in self._versions[0]:
+            raise ValueError(f"Default survey {default!r} not found in {directory}")
+
+    def get(self, name=None):
+        """Returns the survey version called ``name``, or the default one."""
+        by_name = self._versions[0]
+        return by_name.get(name) or by_name[self.default]
+
+    def by_id(self, version_id):
+        """Returns the survey version with ``version_id``, or None."""
+        return self._versions[1].get(version_id)
+
+    def names(self):
+        return sorted(self._versions[0])
+
+    def _cache_path(self, name):
+        return os.path.join(self.cache_dir, f'{name}.pickle')
+
+    def _load(self, name, path):
+        with open(path, 'rb') as f:
+            data = f.read()
+        fingerprint = hashlib.sha256(data).hexdigest()[:12]
+        cached = None
+        try:
+            with open(self._cache_path(name), 'rb') as f:
+                cache_format, cached_fingerprint, survey = pickle.load(f)
+            if cache_format == CACHE_FORMAT:
+                if cached_fingerprint == fingerprint:
+                    return survey
+                cached = survey
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ValueError):
+            pass
+
+        survey = compile_survey(json.loads(data), name, fingerprint)
+        if len(survey.levels) > results_store.LEVEL_SLOTS:
+            raise ValueError(f"Result records hold at most {results_store.LEVEL_SLOTS} levels")
+        # the previous compile of this file (also across restarts) and the version now served under this id
+        for previous in (cached, self._versions[1].get(survey.version_id)):
+            if previous is not None and previous.version_id == survey.version_id and previous.layout != survey.layout:
+                raise ValueError(f"Changes the levels, questions or options of survey version id {survey.version_id}, "
+                                 f"which answer tokens and stored results refer to; give it a new 'id'")
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp = f'{self._cache_path(name)}.{os.getpid()}.tmp'
+            with open(tmp, 'wb') as f:
+                pickle.dump((CACHE_FORMAT, fingerprint, survey), f, pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, self._cache_path(name))
+        except OSError as e:
+            print(f"Error caching compiled survey {name}: {e}")
+        return survey
+
+    def reload(self):
+        """Loads new and changed definition files; returns the names of the versions that changed."""
+        with self._reload_lock:
+            old_by_name = self._versions[0]
+            by_name = {}
+            sources = {}
+            changed = []
+            for path in sorted(glob.glob(os.path.join(self.directory, '*.json'))):
+                name = os.path.splitext(os.path.basename(path))[0]
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                source = (st.st_mtime_ns, st.st_size)
+                if self._sources.get(name) == source and name in old_by_name:
+                    by_name[name] = old_by_name[name]
+                    sources[name] = source
+                    continue
+                try:
+                    if self._failed.get(name) == source:
+                        raise OSError  # still broken, already reported
+                    by_name[name] = self._load(name, path)
+                except (OSError, ValueError) as e:
+                    if self._failed.get(name) != source:
+                        print(f"Error loading survey {path}: {e}")
+                        self._failed[name] = source
+                    if name in old_by_name:
+                        # keep serving the last good version
+                        by_name[name] = old_by_name[name]
+                        sources[name] = self._sources[name]
+                    continue
+                self._failed.pop(name, None)
+                sources[name] = source
+                changed.append(name)
+
+            by_id = {}
+            # the default version wins a clash of version ids
+            for name, survey in sorted(by_name.items(), key=lambda item: item[0] != self.default):
+                other = by_id.get(survey.version_id)
+                if other is not None:
+                    print(f"Error loading survey {name}: version id {survey.version_id} is already used by "
+                          f"{other.name}")
+                    del by_name[name]
+                    sources.pop(name, None)
+                    continue
+                by_id[survey.version_id] = survey
+
+            if self.default not in by_name and self.default in old_by_name:
+                # never lose the default version, e.g. while its file is being rewritten
+                survey = old_by_name[self.default]
+                by_name[self.default] = survey
+                by_id.setdefault(survey.version_id, survey)
+
+            self._sources = sources
+            self._versions = (by_name, by_id)
+            return changed
+
+    def _poll(self):
+        while True:
+            time.sleep(self.poll_interval)
+            try:
+                changed = self.reload()
+            except Exception as e:
+                print(f"Error reloading surveys: {e}")
+                continue
+            if changed:
+                print(f"Reloaded surveys: {', '.join(changed)}")
+
+    def start_polling(self):
+        """Starts the reload thread once per process (safe to call after fork)."""
+        if self._poller_pid == os.getpid() or self.poll_interval <= 0:
+            return
+        with self._reload_lock:
+            if self._poller_pid == os.getpid():
+                return
+            threading.Thread(target=self._poll, name='surveys', daemon=True).start()
+            self._poller_pid = os.getpid()
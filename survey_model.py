@@ -0,0 +1,181 @@
+"""Compiled, read-only form of a survey definition.
+
+The handlers and the scoring code look everything up here instead of walking
+the nested definition, so no per-request lists or key strings are built.
+
+In-progress answers are carried around as a single integer: 2 bits per
+question in survey order, where 0 means unanswered and n the n-th option.
+"""
+import re
+from bisect import bisect_left
+from collections import namedtuple
+
+Question = namedtuple('Question', 'key q q_ar options options_ar')
+Level = namedtuple('Level', 'name position level_en level_ar questions answer_keys')
+
+# States are stored as uint64 in the results log; every level's point table has 4**questions entries.
+MAX_QUESTIONS = 32
+MAX_LEVEL_QUESTIONS = 8
+
+
+class Survey:
+    """The compiled survey: ordered levels plus the lookup tables used for scoring."""
+
+    __slots__ = ('name', 'version_id', 'fingerprint', 'levels', 'level_names', 'level_index', 'answer_keys',
+                 'option_scores', 'option_codes', 'option_letters', 'thresholds',
+                 'level_bits', 'level_point_tables', 'labels', 'recommendations')
+
+    def __init__(self, levels, thresholds, recommendations, name='default', version_id=0, fingerprint=''):
+        self.name = name
+        # stored with every result and in answer tokens, so it must stay stable for a given version
+        self.version_id = version_id
+        # changes whenever the definition does; part of every render cache key
+        self.fingerprint = fingerprint
+        self.levels = levels
+        self.level_names = tuple(level.name for level in levels)
+        # level name -> position in the funnel
+        self.level_index = {level.name: level.position for level in levels}
+        # (answer key, level position) for every question, in survey order
+        self.answer_keys = tuple((key, level.position) for level in levels for key in level.answer_keys)
+        # option letter -> points, taken from the option order of the first question
+        self.option_scores = {option[0]: score for score, option in enumerate(levels[0].questions[0].options)}
+        # option letter <-> 2-bit answer code
+        self.option_letters = tuple(sorted(self.option_scores, key=self.option_scores.get))
+        self.option_codes = {letter: code for code, letter in enumerate(self.option_letters, 1)}
+        # inclusive upper bound of the total score for every level but the last
+        self.thresholds = tuple(thresholds)
+
+        # (shift, mask) of each level's slice of a packed state, and the points for every value of that slice
+        code_points = (0,) + tuple(self.option_scores[letter] for letter in self.option_letters)
+        level_bits = []
+        level_point_tables = []
+        shift = 0
+        for level in levels:
+            width = 2 * len(level.questions)
+            level_bits.append((shift, (1 << width) - 1))
+            level_point_tables.append(tuple(
+                sum(code_points[(bits >> i) & 3] for i in range(0, width, 2)) for bits in range(1 << width)))
+            shift += width
+        self.level_bits = tuple(level_bits)
+        self.level_point_tables = tuple(level_point_tables)
+
+        # level name -> {'en': ..., 'ar': ...} for the result pages and email
+        self.labels = {level.name: {'en': level.level_en, 'ar': level.level_ar} for level in levels}
+        self.recommendations = recommendations
+
+    @property
+    def layout(self):
+        """What packed states and stored results depend on; it must not change within a version id."""
+        return self.level_names, self.answer_keys, self.option_letters
+
+    def level(self, name):
+        """Returns the Level called ``name`` or None."""
+        position = self.level_index.get(name)
+        return None if position is None else self.levels[position]
+
+    def valid_state(self, state):
+        """Whether ``state`` only uses the bits of this survey's questions."""
+        return 0 <= state < 1 << (2 * len(self.answer_keys))
+
+    def pack(self, answers):
+        """Packs a ``{answer key: option}`` mapping into an answer state."""
+        state = 0
+        option_codes = self.option_codes
+        for i, (key, _) in enumerate(self.answer_keys):
+            value = answers.get(key)
+            if value:
+                state |= option_codes.get(value[0], 0) << (2 * i)
+        return state
+
+    def unpack(self, state):
+        """Returns the ``{answer key: option letter}`` mapping of the answered questions."""
+        answers = {}
+        for i, (key, _) in enumerate(self.answer_keys):
+            code = (state >> (2 * i)) & 3
+            if code:
+                answers[key] = self.option_letters[code - 1]
+        return answers
+
+    def with_level(self, state, level, values):
+        """Returns ``state`` with ``level``'s answers replaced by ``values`` (one per question)."""
+        shift, mask = self.level_bits[level.position]
+        bits = 0
+        option_codes = self.option_codes
+        for i, value in enumerate(values):
+            if value:
+                bits |= option_codes.get(value[0], 0) << (2 * i)
+        return (state & ~(mask << shift)) | (bits << shift)
+
+    def state_scores(self, state):
+        """Returns the per-level points of an answer state, in level order."""
+        return [table[(state >> shift) & mask]
+                for (shift, mask), table in zip(self.level_bits, self.level_point_tables)]
+
+    def final_level(self, total_score):
+        """Maps a total score to the name of the maturity level it falls in."""
+        return self.level_names[bisect_left(self.thresholds, total_score)]
+
+
+def _require(condition, message):
+    if not condition:
+        raise ValueError(message)
+
+
+def _is_int(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def compile_survey(definition, name='default', fingerprint=''):
+    """Validates a survey definition (as loaded from surveys/<name>.json) and compiles it."""
+    _require(isinstance(definition, dict), "Survey definition must be an object")
+    version_id = definition.get('id')
+    _require(_is_int(version_id) and 0 <= version_id < 256, "'id' must be an integer from 0 to 255")
+    level_defs = definition.get('levels')
+    _require(isinstance(level_defs, list) and level_defs, "'levels' must be a non-empty list")
+
+    levels = []
+    recommendations = {}
+    for position, data in enumerate(level_defs):
+        _require(isinstance(data, dict), f"levels[{position}] must be an object")
+        level_name = data.get('name')
+        # part of every answer key, which travels in form fields and legacy answers strings
+        _require(isinstance(level_name, str) and re.fullmatch(r'\w+', level_name),
+                 f"levels[{position}] needs a 'name' made of letters, digits and underscores")
+        _require(level_name not in recommendations, f"Duplicate level {level_name!r}")
+        for field in ('level_en', 'level_ar', 'recommendation_en', 'recommendation_ar'):
+            _require(isinstance(data.get(field), str), f"Level {level_name!r} needs a {field!r} string")
+        questions = data.get('questions')
+        _require(isinstance(questions, list) and questions, f"Level {level_name!r} needs a list of questions")
+        _require(len(questions) <= MAX_LEVEL_QUESTIONS,
+                 f"Level {level_name!r} has more than {MAX_LEVEL_QUESTIONS} questions")
+        compiled = []
+        for i, q in enumerate(questions):
+            _require(isinstance(q, dict), f"{level_name} question {i} must be an object")
+            for field in ('q', 'q_ar'):
+                _require(isinstance(q.get(field), str), f"{level_name} question {i} needs a {field!r} string")
+            options, options_ar = q.get('options'), q.get('options_ar')
+            _require(isinstance(options, list) and isinstance(options_ar, list) and len(options) == len(options_ar),
+                     f"{level_name} question {i} needs matching 'options' and 'options_ar' lists")
+            _require(2 <= len(options) <= 3, f"{level_name} question {i}: answer states hold 2 or 3 options")
+            _require(all(isinstance(option, str) and option for option in options + options_ar),
+                     f"{level_name} question {i}: options must be non-empty strings")
+            compiled.append(Question(f"q_{level_name}_{i}", q['q'], q['q_ar'], tuple(options), tuple(options_ar)))
+        compiled = tuple(compiled)
+        levels.append(Level(level_name, position, data['level_en'], data['level_ar'], compiled,
+                            tuple(q.key for q in compiled)))
+        recommendations[level_name] = {'en': data['recommendation_en'], 'ar': data['recommendation_ar']}
+
+    _require(sum(len(level.questions) for level in levels) <= MAX_QUESTIONS,
+             f"An answer state holds at most {MAX_QUESTIONS} questions")
+
+    thresholds = definition.get('thresholds')
+    _require(isinstance(thresholds, list) and len(thresholds) == len(levels) - 1,
+             "Expected one score threshold between each pair of levels")
+    _require(all(_is_int(threshold) for threshold in thresholds) and thresholds == sorted(thresholds),
+             "'thresholds' must be integers in increasing order")
+    option_letters = [option[:1] for option in levels[0].questions[0].options]
+    _require(len(set(option_letters)) == len(option_letters), "Options must start with distinct letters")
+    _require(all([option[:1] for option in q.options] == option_letters[:len(q.options)]
+                 for level in levels for q in level.questions),
+             "Every question must use the same option letters in the same order")
+    return Survey(tuple(levels), thresholds, recommendations, name, version_id, fingerprint)
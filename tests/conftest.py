@@ -0,0 +1,33 @@
+import os
+import sys
+import threading
+
+import pytest
+
+# The app is a set of top-level modules; make them importable from the tests.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def app_client(tmp_path, monkeypatch):
+    """A test client whose results log, rate limits and mail queue live in ``tmp_path``.
+
+    Result emails are queued but never delivered.
+    """
+    import admission
+    import app
+    import mailer
+    import results_store
+
+    monkeypatch.setattr(results_store, 'RESULTS_PATH', str(tmp_path / 'results.log'))
+    monkeypatch.setattr(results_store, '_buffer', [])
+    monkeypatch.setattr(results_store, '_listeners', [])
+    monkeypatch.setattr(results_store, '_ensure_flusher', lambda: None)
+    monkeypatch.setattr(admission, 'ADMISSION_DIR', str(tmp_path / 'admission'))
+    monkeypatch.setattr(admission, '_local', threading.local())
+    monkeypatch.setattr(mailer, 'QUEUE_PATH', str(tmp_path / 'mail_queue.db'))
+    monkeypatch.setattr(mailer, '_local', threading.local())
+    monkeypatch.setattr(mailer, 'start_workers', lambda: None)
+    monkeypatch.setenv('MAIL_SERVER', '127.0.0.1')
+    monkeypatch.setenv('MAIL_SENDER', 'survey@example.com')
+    return app.app.test_client()
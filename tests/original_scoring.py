@@ -0,0 +1,57 @@
+"""The scoring as first written in app.py, which the current code must keep matching."""
+import random
+
+# Questions per level in the original survey.
+QUESTION_COUNTS = {'Minimal': 3, 'Emerging': 3, 'Basic': 3, 'Intermediate': 3, 'Advanced': 6}
+
+
+def original_maturity(answers_str):
+    """The scoring as first written in app.py, with its hard-coded cutoffs."""
+    total_score = 0
+    answers = {}
+    if answers_str:
+        try:
+            answers = dict(item.split("=") for item in answers_str.split("&"))
+        except ValueError:
+            answers = {}
+
+    level_scores_breakdown = {level: 0 for level in QUESTION_COUNTS}
+    for level, count in QUESTION_COUNTS.items():
+        for i in range(count):
+            user_answer = answers.get(f"q_{level}_{i}")
+            if user_answer:
+                if user_answer.startswith('B'):
+                    total_score += 1
+                    level_scores_breakdown[level] += 1
+                elif user_answer.startswith('C'):
+                    total_score += 2
+                    level_scores_breakdown[level] += 2
+
+    if total_score <= 6:
+        final_level = "Minimal"
+    elif 7 <= total_score <= 12:
+        final_level = "Emerging"
+    elif 13 <= total_score <= 19:
+        final_level = "Basic"
+    elif 20 <= total_score <= 26:
+        final_level = "Intermediate"
+    else:
+        final_level = "Advanced"
+    return final_level, level_scores_breakdown
+
+
+def random_answers(rng):
+    keys = [f"q_{level}_{i}" for level, count in QUESTION_COUNTS.items() for i in range(count)]
+    items = [f"{key}={rng.choice(['A', 'B', 'C', 'Bx', 'C. Yes', '', 'b', 'x'])}"
+             for key in rng.sample(keys, rng.randint(0, len(keys)))]
+    if items and rng.random() < 0.2:
+        items.append(f"{items[0].partition('=')[0]}=C")  # a repeated key keeps its last value
+    if rng.random() < 0.1:
+        items.append(rng.choice(['junk', 'a=b=c', '', 'q_Basic_9=C', 'q_Basic_0x=C']))
+    return '&'.join(items)
+
+
+def sample_answers(count, seed=1234):
+    """Random and malformed answers strings, plus a few edge cases."""
+    rng = random.Random(seed)
+    return [random_answers(rng) for _ in range(count)] + ['', '=', '&', 'q_Minimal_0=C&']
@@ -0,0 +1,79 @@
+"""Token buckets, slot pools and the 429 responses built on them."""
+import threading
+
+import pytest
+
+import admission
+import app
+
+
+@pytest.fixture(autouse=True)
+def admission_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(admission, 'ADMISSION_DIR', str(tmp_path))
+    monkeypatch.setattr(admission, '_local', threading.local())
+
+
+@pytest.mark.parametrize('spec, limit', [('5/hour', admission.Limit(5, 3600)), (' 2/second ', admission.Limit(2, 1)),
+                                         ('', None), ('0', None), (None, None)])
+def test_parse_limit(spec, limit):
+    assert admission.parse_limit(spec) == limit
+
+
+@pytest.mark.parametrize('spec', ['5/week', '0/hour', 'five/hour', '5'])
+def test_parse_limit_rejects(spec):
+    with pytest.raises(ValueError):
+        admission.parse_limit(spec)
+
+
+def test_bucket_allows_a_burst_then_refills():
+    limit = admission.Limit(3, 60)
+    assert [admission.take(('a', limit), now=1000) for _ in range(3)] == [0, 0, 0]
+    assert admission.take(('a', limit), now=1000) == pytest.approx(20)
+    # other keys have buckets of their own
+    assert admission.take(('b', limit), now=1000) == 0
+    # one token comes back every period / burst seconds
+    assert admission.take(('a', limit), now=1010) == pytest.approx(10)
+    assert admission.take(('a', limit), now=1020) == 0
+    assert admission.take(('a', limit), now=1020) > 0
+
+
+def test_take_is_all_or_nothing():
+    wide, narrow = admission.Limit(10, 60), admission.Limit(1, 60)
+    assert admission.take(('wide', wide), ('narrow', narrow), now=0) == 0
+    assert admission.take(('wide', wide), ('narrow', narrow), now=0) == pytest.approx(60)
+    # the refused request took nothing from the bucket that had room
+    assert [admission.take(('wide', wide), now=0) for _ in range(9)] == [0] * 9
+    assert admission.take(('wide', wide), now=0) > 0
+
+
+def test_disabled_limits_always_admit():
+    assert all(admission.take(('a', None), now=0) == 0 for _ in range(100))
+
+
+def test_slot_pool_caps_holders():
+    pool = admission.SlotPool('jobs', 2, poll_interval=0.01)
+    with pool.hold() as first, pool.hold() as second:
+        assert first and second
+        with pool.hold(timeout=0.05) as third:
+            assert not third
+    with pool.hold(timeout=0) as again:
+        assert again
+
+
+def test_requests_over_the_limit_get_429(app_client, monkeypatch):
+    monkeypatch.setattr(app, 'REQUEST_LIMIT', admission.Limit(2, 3600))
+    assert [app_client.get('/').status_code for _ in range(3)] == [200, 200, 429]
+    response = app_client.get('/survey')
+    assert response.status_code == 429
+    assert 0 < int(response.headers['Retry-After']) <= 1800
+    # assets and metrics are not counted against the limit
+    assert app_client.get('/metrics').status_code == 200
+
+
+def test_email_recipient_limit(app_client, monkeypatch):
+    monkeypatch.setattr(app, 'EMAIL_RECIPIENT_LIMIT', admission.Limit(1, 3600))
+    survey = app.surveys.get()
+    state = app.encode_state(survey.pack({}), app.app.secret_key, survey.version_id)
+    statuses = [app_client.post('/final', data={'state': state, 'email': email}).status_code
+                for email in ('one@example.com', 'ONE@example.com', 'two@example.com')]
+    assert statuses == [200, 429, 200]
@@ -0,0 +1,106 @@
+"""Dashboard counters bumped per committed batch and rebuilt from the results log."""
+import threading
+
+import pytest
+
+import analytics
+import results_store
+from app import surveys
+
+DAY = 1700000000  # 2023-11-14 UTC
+NEXT_MONTH = DAY + 20 * 86400  # 2023-12-04 UTC
+
+
+@pytest.fixture(autouse=True)
+def analytics_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(analytics, 'ANALYTICS_PATH', str(tmp_path / 'analytics.db'))
+    monkeypatch.setattr(analytics, '_local', threading.local())
+
+
+def submission(timestamp, answers, lang='en'):
+    """An unpacked results record for ``answers``, scored like the app scores it."""
+    survey = surveys.get()
+    state = survey.pack(answers)
+    scores = tuple(survey.state_scores(state))
+    final_level = survey.level_index[survey.final_level(sum(scores))]
+    return timestamp, state, scores, final_level, lang, survey.version_id
+
+
+@pytest.fixture
+def records():
+    return [submission(DAY, {'q_Minimal_0': 'C', 'q_Minimal_1': 'A'}),
+            submission(DAY, {'q_Minimal_0': 'C'}, lang='ar'),
+            submission(NEXT_MONTH, {}, lang=None)]
+
+
+def test_apply_counts_each_bucket(records):
+    analytics.apply(records, surveys.by_id)
+    survey = surveys.get()
+    first, second, third = (survey.level_names[record[3]] for record in records)
+
+    days = analytics.query('day', '2023-11-01', '2023-12-31')
+    assert set(days) == {'2023-11-14', '2023-12-04'}
+    assert days['2023-11-14']['completed'] == {'': 2}
+    assert days['2023-11-14']['pick'] == {'q_Minimal_0=C': 2, 'q_Minimal_1=A': 1}
+    assert days['2023-12-04'] == {'completed': {'': 1}, 'final_level': {third: 1},
+                                  'points': {level: 0 for level in survey.level_names}}
+
+    everything = analytics.query('all', '', '')['']
+    assert everything['completed'] == {'': 3}
+    assert sum(everything['final_level'].values()) == 3
+    assert everything['final_level'][first] >= 1
+    assert everything['points'][survey.level_names[0]] == records[0][2][0] + records[1][2][0]
+
+    # counters are kept per language; a record without one counts as 'other'
+    assert analytics.query('month', '2023-11', '2023-12', lang='ar') == {
+        '2023-11': {'completed': {'': 1}, 'final_level': {second: 1},
+                    'points': dict(zip(survey.level_names, records[1][2])), 'pick': {'q_Minimal_0=C': 1}}}
+    assert analytics.level_distribution('month', '2023-12', '2023-12', lang='other') == {
+        '2023-12': {'completed': 1, 'final_level': {third: 1}}}
+
+
+def test_records_of_unknown_surveys_are_skipped(records):
+    timestamp, state, scores, final_level, lang, version = records[0]
+    analytics.apply([(timestamp, state, scores, final_level, lang, version + 1000),
+                     (timestamp, state, scores, 99, lang, version)], surveys.by_id)
+    assert analytics.query('all', '', '') == {}
+
+
+def test_rates_divide_by_completed(records):
+    analytics.apply(records, surveys.by_id)
+    rates = analytics.pick_rates('day', '2023-11-14', '2023-11-14')['2023-11-14']
+    assert rates == {'completed': 2, 'questions': {'q_Minimal_0': {'C': 1.0}, 'q_Minimal_1': {'A': 0.5}}}
+    means = analytics.mean_scores('all', '', '')['']
+    assert means['completed'] == 3
+    assert means['mean_points'][surveys.get().level_names[0]] == round(
+        sum(record[2][0] for record in records) / 3, 3)
+
+
+def test_rebuild_matches_incremental_counts(tmp_path, monkeypatch, records):
+    monkeypatch.setattr(results_store, 'RESULTS_PATH', str(tmp_path / 'results.log'))
+    monkeypatch.setattr(results_store, '_buffer', [])
+    monkeypatch.setattr(results_store, '_listeners', [])
+    monkeypatch.setattr(results_store, '_ensure_flusher', lambda: None)
+    for timestamp, state, scores, final_level, lang, version in records:
+        results_store.record(state, scores, final_level, lang, version, timestamp=timestamp)
+    results_store.flush()
+
+    analytics.apply(records, surveys.by_id)
+    incremental = analytics.query('day', '2023-11-01', '2023-12-31')
+    # applying a batch twice double counts; a rebuild starts over from the log
+    analytics.apply(records, surveys.by_id)
+    analytics.rebuild(results_store.RESULTS_PATH, surveys.by_id, batch_size=2)
+    assert analytics.query('day', '2023-11-01', '2023-12-31') == incremental
+
+
+def test_failed_rebuild_keeps_the_aggregates(tmp_path, records):
+    analytics.apply(records, surveys.by_id)
+    before = analytics.query('all', '', '')
+    with pytest.raises(FileNotFoundError):
+        analytics.rebuild(str(tmp_path / 'missing.log'), surveys.by_id)
+    assert analytics.query('all', '', '') == before
+
+
+def test_unknown_bucket():
+    with pytest.raises(ValueError):
+        analytics.query('week')
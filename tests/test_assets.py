@@ -0,0 +1,32 @@
+"""Fingerprinted assets under /assets/."""
+import pytest
+
+import app
+
+
+@pytest.fixture
+def built(app_client, tmp_path, monkeypatch):
+    static = tmp_path / 'static'
+    (static / 'dist' / 'css').mkdir(parents=True)
+    (static / 'dist' / 'css' / 'style.0123abcd.css').write_text('body{}')
+    (static / 'dist' / 'css' / 'style.0123abcd.css.gz').write_bytes(b'gzipped')
+    (static / 'dist' / 'manifest.json').write_text('{"css/style.css": "css/style.0123abcd.css"}')
+    (static / 'dist' / 'css' / 'stray.css').write_text('body{}')
+    monkeypatch.setattr(app.app, 'static_folder', str(static))
+    monkeypatch.setattr(app, 'ASSET_MANIFEST', {'css/style.css': 'css/style.0123abcd.css'})
+    return app_client
+
+
+def test_built_asset_is_immutable(built):
+    response = built.get('/assets/css/style.0123abcd.css')
+    assert response.status_code == 200
+    assert response.data == b'body{}'
+    assert 'immutable' in response.headers['Cache-Control']
+
+    response = built.get('/assets/css/style.0123abcd.css', headers={'Accept-Encoding': 'gzip'})
+    assert (response.data, response.headers['Content-Encoding']) == (b'gzipped', 'gzip')
+
+
+@pytest.mark.parametrize('filename', ['manifest.json', 'css/stray.css', 'css/style.css', 'css/missing.0123.css.gz'])
+def test_files_outside_the_manifest_are_not_served(built, filename):
+    assert built.get(f'/assets/{filename}').status_code == 404
@@ -0,0 +1,63 @@
+"""Vectorized batch scoring against the original per-row scoring."""
+import csv
+import io
+import json
+
+import pytest
+
+import batch_scoring
+from app import surveys
+from original_scoring import original_maturity, sample_answers
+
+
+@pytest.fixture(scope='module')
+def answer_strings():
+    return sample_answers(3000, seed=99)
+
+
+def test_batch_scoring_matches_original(answer_strings):
+    survey = surveys.get()
+    breakdown, totals, level_index = batch_scoring.score_matrix(batch_scoring.answer_matrix(answer_strings))
+    for answers_str, scores, total, position in zip(answer_strings, breakdown.tolist(), totals.tolist(),
+                                                     level_index.tolist()):
+        final_level, level_scores = original_maturity(answers_str)
+        assert (survey.level_names[position], dict(zip(survey.level_names, scores))) == (final_level, level_scores)
+        assert total == sum(level_scores.values())
+
+
+def test_non_string_values_score_as_no_answers():
+    matrix = batch_scoring.answer_matrix([None, 3, ['q_Minimal_0=C'], 'q_Minimal_0=C'])
+    assert matrix.sum(axis=1).tolist() == [0, 0, 0, 2]
+
+
+@pytest.mark.parametrize('out_format', ['csv', 'jsonl'])
+def test_score_file_output(tmp_path, answer_strings, out_format):
+    rows = answer_strings[:500]
+    path = tmp_path / 'answers.jsonl'
+    with open(path, 'w', encoding='utf-8') as f:
+        for answers_str in rows:
+            f.write(json.dumps({'answers': answers_str}) + '\n')
+        # values that are not answers strings score as an empty survey
+        for value in ([1, 2], 7, {'q_Minimal_0': 'C'}, None):
+            f.write(json.dumps({'answers': value}) + '\n')
+        f.write(json.dumps('q_Minimal_0=C') + '\n')
+    rows += ['', '', '', '', 'q_Minimal_0=C']
+
+    out = io.StringIO(newline='')
+    distribution = batch_scoring.score_file(str(path), out, out_format=out_format, chunk_size=128)
+
+    level_names = surveys.get().level_names
+    expected = io.StringIO(newline='')
+    writer = csv.writer(expected)
+    if out_format == 'csv':
+        writer.writerow(['row'] + list(level_names) + ['total_score', 'final_level'])
+    for row, answers_str in enumerate(rows):
+        final_level, level_scores = original_maturity(answers_str)
+        total = sum(level_scores.values())
+        if out_format == 'csv':
+            writer.writerow([row] + list(level_scores.values()) + [total, final_level])
+        else:
+            expected.write(json.dumps({'row': row, 'final_level': final_level, 'total_score': total,
+                                       'level_scores': level_scores}) + '\n')
+    assert out.getvalue() == expected.getvalue()
+    assert sum(distribution.values()) == len(rows)
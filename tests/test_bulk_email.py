@@ -0,0 +1,77 @@
+"""Resumable bulk sends and the BCC digest against fake_smtp."""
+import json
+import smtplib
+
+import pytest
+
+import bulk_email
+import mailer
+from fake_smtp import FakeSMTPServer
+
+BCC = 'digest@example.com'
+
+
+@pytest.fixture
+def smtp(monkeypatch):
+    server = FakeSMTPServer().start()
+    monkeypatch.setenv('MAIL_SERVER', '127.0.0.1')
+    monkeypatch.setenv('MAIL_PORT', str(server.port))
+    monkeypatch.setenv('MAIL_USE_SSL', 'false')
+    monkeypatch.setenv('MAIL_SENDER', 'survey@example.com')
+    monkeypatch.delenv('MAIL_USERNAME', raising=False)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def write_rows(path, emails):
+    with open(path, 'w', encoding='utf-8') as f:
+        for email in emails:
+            f.write(json.dumps({'email': email, 'answers': 'q_Minimal_0=C&q_Minimal_1=B'}) + '\n')
+
+
+def send(tmp_path, **kwargs):
+    return bulk_email.send_bulk(str(tmp_path / 'rows.jsonl'), str(tmp_path / 'rows.progress'), rate=0, **kwargs)
+
+
+def test_resumed_run_skips_sent_rows(tmp_path, smtp):
+    write_rows(tmp_path / 'rows.jsonl', ['a@example.com', 'b@example.com'])
+    assert send(tmp_path) == (2, 0)
+    write_rows(tmp_path / 'rows.jsonl', ['a@example.com', 'b@example.com', 'c@example.com', 'not an address'])
+    assert send(tmp_path) == (1, 1)
+    assert smtp.messages == 3
+
+
+def test_digest_covers_rows_sent_by_earlier_runs(tmp_path, smtp):
+    write_rows(tmp_path / 'rows.jsonl', ['a@example.com', 'b@example.com'])
+    send(tmp_path)
+    write_rows(tmp_path / 'rows.jsonl', ['a@example.com', 'b@example.com', 'c@example.com'])
+    assert send(tmp_path, bcc_email=BCC, bcc_digest=True) == (1, 0)
+    assert (smtp.messages, smtp.recipients) == (4, 4)
+    done, undigested = bulk_email.load_progress(str(tmp_path / 'rows.progress'))
+    assert len(done) == 3
+    assert undigested == []
+
+    # nothing new: no second digest
+    assert send(tmp_path, bcc_email=BCC, bcc_digest=True) == (0, 0)
+    assert smtp.messages == 4
+
+
+def test_failed_digest_is_sent_by_the_next_run(tmp_path, smtp, monkeypatch):
+    send_message = mailer.SMTPSession.send
+
+    def refuse_digest(session, msg, recipients):
+        if recipients == [BCC]:
+            raise smtplib.SMTPServerDisconnected('Connection unexpectedly closed')
+        return send_message(session, msg, recipients)
+
+    write_rows(tmp_path / 'rows.jsonl', ['a@example.com', 'b@example.com'])
+    with monkeypatch.context() as patch:
+        patch.setattr(mailer.SMTPSession, 'send', refuse_digest)
+        assert send(tmp_path, bcc_email=BCC, bcc_digest=True) == (2, 1)
+    _, undigested = bulk_email.load_progress(str(tmp_path / 'rows.progress'))
+    assert [email for email, _, _ in undigested] == ['a@example.com', 'b@example.com']
+
+    assert send(tmp_path, bcc_email=BCC, bcc_digest=True) == (0, 0)
+    assert smtp.messages == 3
+    assert bulk_email.load_progress(str(tmp_path / 'rows.progress'))[1] == []
@@ -0,0 +1,62 @@
+"""Submitting an assessment on /final: the queued email and the stored result."""
+import mailer
+import results_store
+from answer_state import encode_state
+from app import app, surveys
+
+
+def state(option):
+    """The state of a survey answered with ``option`` everywhere."""
+    survey = surveys.get()
+    return survey.pack({key: option for key, _ in survey.answer_keys})
+
+
+def token(option):
+    return encode_state(state(option), app.secret_key, surveys.get().version_id)
+
+
+def stored():
+    results_store.flush()
+    try:
+        return list(results_store.iter_records(results_store.RESULTS_PATH))
+    except FileNotFoundError:
+        return []
+
+
+def queued():
+    return mailer._db().execute('SELECT receiver FROM jobs ORDER BY id').fetchall()
+
+
+def test_submission_is_queued_and_recorded(app_client):
+    response = app_client.post('/final?lang=ar', data={'state': token('C'), 'email': ' user@example.com '})
+    assert response.status_code == 200
+    assert queued() == [('user@example.com',)]
+    [(_, _, level_scores, final_level, lang, version)] = stored()
+    survey = surveys.get()
+    assert (survey.level_names[final_level], lang, version) == ('Advanced', 'ar', survey.version_id)
+    assert sum(level_scores) == 2 * len(survey.answer_keys)
+
+
+def test_same_answers_sent_again_are_recorded_once(app_client):
+    for email in ('first@example.com', 'second@example.com'):
+        assert app_client.post('/final', data={'state': token('B'), 'email': email}).status_code == 200
+    assert app_client.post('/final', data={'state': token('C'), 'email': 'first@example.com'}).status_code == 200
+    assert len(queued()) == 3
+    assert [record[1] for record in stored()] == [state('B'), state('C')]
+
+
+def test_failed_enqueue_records_nothing(app_client, monkeypatch):
+    monkeypatch.delenv('MAIL_SERVER')
+    response = app_client.post('/final', data={'state': token('B'), 'email': 'user@example.com'})
+    assert response.status_code == 500
+    assert stored() == []
+    monkeypatch.setenv('MAIL_SERVER', '127.0.0.1')
+    assert app_client.post('/final', data={'state': token('B'), 'email': 'user@example.com'}).status_code == 200
+    assert len(stored()) == 1
+
+
+def test_invalid_address_is_rejected(app_client):
+    response = app_client.post('/final', data={'state': token('B'), 'email': 'user@exa mple.com'})
+    assert response.status_code == 400
+    assert queued() == []
+    assert stored() == []
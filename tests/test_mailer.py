@@ -0,0 +1,120 @@
+"""Delivery, retry and session reuse of the mail queue against fake_smtp."""
+import socket
+import sqlite3
+import threading
+import time
+
+import pytest
+
+import mailer
+from fake_smtp import FakeSMTPServer
+
+
+@pytest.fixture
+def queue(tmp_path, monkeypatch):
+    monkeypatch.setattr(mailer, 'QUEUE_PATH', str(tmp_path / 'mail_queue.db'))
+    monkeypatch.setattr(mailer, '_local', threading.local())
+    monkeypatch.setattr(mailer, 'start_workers', lambda: None)
+    monkeypatch.setenv('MAIL_SERVER', '127.0.0.1')
+    monkeypatch.setenv('MAIL_SENDER', 'survey@example.com')
+    return mailer._db()
+
+
+@pytest.fixture
+def smtp():
+    server = FakeSMTPServer().start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def settings(port, sender='survey@example.com'):
+    return {'server': '127.0.0.1', 'port': port, 'username': None, 'password': None, 'sender': sender,
+            'use_ssl': False, 'use_tls': False}
+
+
+def closed_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def jobs(conn):
+    return conn.execute('SELECT status, attempts, next_attempt FROM jobs ORDER BY id').fetchall()
+
+
+def drain(session):
+    while True:
+        job = mailer._claim()
+        if job is None:
+            return
+        mailer._deliver(session, job)
+
+
+def test_jobs_are_delivered_over_one_session(queue, smtp):
+    for i in range(3):
+        mailer.enqueue_email(f'user{i}@example.com', 'Results', '<p>hi</p>', 'bcc@example.com')
+    with mailer.SMTPSession(settings(smtp.port)) as session:
+        drain(session)
+    assert smtp.messages == 3
+    assert smtp.recipients == 6
+    assert smtp.sessions == 1
+    assert jobs(queue) == []
+
+
+def test_session_reconnects_after_idle_timeout(queue, smtp, monkeypatch):
+    monkeypatch.setattr(mailer, 'IDLE_TIMEOUT', 0)
+    for i in range(2):
+        mailer.enqueue_email(f'user{i}@example.com', 'Results', '<p>hi</p>')
+    with mailer.SMTPSession(settings(smtp.port)) as session:
+        drain(session)
+    assert (smtp.messages, smtp.sessions) == (2, 2)
+
+
+def test_failed_send_is_retried_with_backoff(queue, monkeypatch):
+    monkeypatch.setattr(mailer, 'MAX_ATTEMPTS', 3)
+    mailer.enqueue_email('user@example.com', 'Results', '<p>hi</p>')
+    session = mailer.SMTPSession(settings(closed_port()))
+    delays = []
+    for attempt in range(1, 4):
+        queue.execute('UPDATE jobs SET next_attempt = 0')
+        before = time.time()
+        mailer._deliver(session, mailer._claim())
+        status, attempts, next_attempt = jobs(queue)[0]
+        assert attempts == attempt
+        delays.append(next_attempt - before)
+    assert status == 'failed'
+    assert delays[1] == pytest.approx(2 * delays[0], abs=0.5)
+
+
+def test_unexpected_error_does_not_stop_delivery(queue, smtp):
+    mailer.enqueue_email('user@example.com', 'Results', '<p>hi</p>')
+    # a session without a sender fails inside smtplib with AttributeError
+    mailer._deliver(mailer.SMTPSession(settings(smtp.port, sender=None)), mailer._claim())
+    assert jobs(queue)[0][:2] == ('pending', 1)
+
+
+def test_invalid_address_fails_permanently(queue, smtp):
+    mailer.enqueue_email('usér@example.com', 'Results', '<p>hi</p>')
+    mailer._deliver(mailer.SMTPSession(settings(smtp.port)), mailer._claim())
+    assert jobs(queue)[0][:2] == ('failed', 1)
+    assert smtp.messages == 0
+
+
+def test_queue_errors_after_sending_are_not_raised(queue, smtp, monkeypatch):
+    def broken_finish(*args, **kwargs):
+        raise sqlite3.OperationalError('database is locked')
+
+    mailer.enqueue_email('user@example.com', 'Results', '<p>hi</p>')
+    monkeypatch.setattr(mailer, '_finish', broken_finish)
+    mailer._deliver(mailer.SMTPSession(settings(smtp.port)), mailer._claim())
+    assert smtp.messages == 1
+    assert jobs(queue)[0][0] == 'sending'
+
+
+def test_enqueue_requires_a_sender(queue, monkeypatch):
+    monkeypatch.delenv('MAIL_SENDER')
+    monkeypatch.delenv('MAIL_USERNAME', raising=False)
+    with pytest.raises(ValueError):
+        mailer.enqueue_email('user@example.com', 'Results', '<p>hi</p>')
+    assert jobs(queue) == []
@@ -0,0 +1,86 @@
+"""Merging the metrics snapshots of several workers on /metrics."""
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+import metrics
+
+
+@pytest.fixture(autouse=True)
+def metrics_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, 'METRICS_DIR', str(tmp_path))
+    monkeypatch.setattr(metrics, '_counters', {})
+    monkeypatch.setattr(metrics, '_histograms', {})
+    monkeypatch.setattr(metrics, '_collectors', [])
+    monkeypatch.setattr(metrics, '_ensure_flusher', lambda: None)
+    return tmp_path
+
+
+def exited_pid():
+    process = subprocess.Popen([sys.executable, '-c', 'pass'])
+    process.wait()
+    return process.pid
+
+
+def write_snapshot(directory, pid, counters=(), gauges=(), histograms=()):
+    with open(directory / f'{pid}.json', 'w') as f:
+        json.dump({'counters': list(counters), 'gauges': list(gauges), 'histograms': list(histograms)}, f)
+
+
+def samples(text):
+    return dict(line.rsplit(' ', 1) for line in text.splitlines() if not line.startswith('#'))
+
+
+def test_counters_and_histograms_are_summed_across_workers(metrics_dir):
+    metrics.inc('survey_completed_total', final_level='Basic', lang='en')
+    metrics.inc('survey_completed_total', 2, final_level='Basic', lang='en')
+    metrics.observe('survey_smtp_send_duration_seconds', 0.003)
+    histogram = [0] * (len(metrics.LATENCY_BUCKETS) + 2)
+    histogram[0], histogram[-2], histogram[-1] = 1, 0.0005, 1
+    write_snapshot(metrics_dir, os.getppid(),
+                   counters=[['survey_completed_total', {'final_level': 'Basic', 'lang': 'en'}, 4],
+                             ['survey_completed_total', {'final_level': 'Advanced', 'lang': 'ar'}, 1]],
+                   histograms=[['survey_smtp_send_duration_seconds', {}, histogram]])
+
+    result = samples(metrics.render())
+    assert result['survey_completed_total{final_level="Basic",lang="en"}'] == '7'
+    assert result['survey_completed_total{final_level="Advanced",lang="ar"}'] == '1'
+    assert result['survey_smtp_send_duration_seconds_bucket{le="0.001"}'] == '1'
+    assert result['survey_smtp_send_duration_seconds_bucket{le="0.005"}'] == '2'
+    assert result['survey_smtp_send_duration_seconds_bucket{le="+Inf"}'] == '2'
+    assert result['survey_smtp_send_duration_seconds_count'] == '2'
+    assert float(result['survey_smtp_send_duration_seconds_sum']) == pytest.approx(0.0035)
+
+
+def test_exited_workers_keep_counters_but_not_gauges(metrics_dir):
+    metrics.register_collector(lambda: [('survey_render_cache_entries', {}, 5),
+                                        ('survey_render_cache_hits_total', {}, 10)])
+    dead = exited_pid()
+    write_snapshot(metrics_dir, dead, counters=[['survey_render_cache_hits_total', {}, 3]],
+                   gauges=[['survey_render_cache_entries', {}, 7]])
+    write_snapshot(metrics_dir, os.getppid(), gauges=[['survey_render_cache_entries', {}, 2]])
+
+    result = samples(metrics.render())
+    assert result['survey_render_cache_hits_total'] == '13'
+    assert result['survey_render_cache_entries'] == '7'
+
+
+def test_unreadable_snapshots_are_skipped(metrics_dir):
+    (metrics_dir / '12345.json').write_text('{"counters": [')
+    (metrics_dir / 'notes.txt').write_text('not a snapshot')
+    metrics.inc('survey_rate_limited_total', scope='email')
+    assert samples(metrics.render()) == {'survey_rate_limited_total{scope="email"}': '1'}
+
+
+def test_label_values_are_escaped(metrics_dir):
+    metrics.inc('survey_rate_limited_total', scope='a"b\\c\nd')
+    assert 'survey_rate_limited_total{scope="a\\"b\\\\c\\nd"} 1' in metrics.render()
+
+
+def test_clear_removes_old_snapshots(metrics_dir):
+    write_snapshot(metrics_dir, exited_pid(), counters=[['survey_smtp_sent_total', {}, 9]])
+    metrics.clear()
+    assert 'survey_smtp_sent_total' not in samples(metrics.render())
@@ -0,0 +1,55 @@
+"""Rendered pages reused per key and dropped when a template changes."""
+import pytest
+from flask import Flask
+
+import app
+from render_cache import RenderCache
+
+
+@pytest.fixture
+def templates(tmp_path):
+    (tmp_path / 'page.html').write_text('{% import "macros.html" as m %}{{ m.greet(name) }}')
+    (tmp_path / 'macros.html').write_text('{% macro greet(name) %}Hello {{ name }}{% endmacro %}')
+    return tmp_path
+
+
+@pytest.fixture
+def cache(templates):
+    flask_app = Flask(__name__, template_folder=str(templates))
+    cache = RenderCache(str(templates), maxsize=2, check_interval=0)
+    with flask_app.test_request_context():
+        yield cache
+
+
+def test_same_key_is_rendered_once(cache):
+    assert cache.render('page.html', 'a', name='a') == 'Hello a'
+    assert cache.render('page.html', 'a', name='ignored') == 'Hello a'
+    assert cache.render('page.html', 'b', name='b') == 'Hello b'
+    assert cache.stats() == {'hits': 1, 'misses': 2, 'size': 2, 'maxsize': 2}
+
+    cache.render('page.html', 'c', name='c')
+    assert cache.stats()['size'] == 2
+    assert cache.render('page.html', 'a', name='again') == 'Hello again'
+
+
+def test_changed_import_drops_rendered_pages(cache, templates):
+    assert cache.render('page.html', 'a', name='a') == 'Hello a'
+    (templates / 'macros.html').write_text('{% macro greet(name) %}Welcome back {{ name }}{% endmacro %}')
+    assert cache.render('page.html', 'a', name='a') == 'Welcome back a'
+    assert cache.stats()['misses'] == 2
+
+
+def test_unknown_languages_share_the_english_page(app_client, monkeypatch):
+    cache = RenderCache(app.render_cache.template_dir)
+    monkeypatch.setattr(app, 'render_cache', cache)
+
+    english = app_client.get('/survey').data
+    for lang in ('en', 'fr', '<script>', ''):
+        assert app_client.get('/survey', query_string={'lang': lang}).data == english
+    assert app_client.get('/survey?lang=ar').data != english
+    assert cache.stats()['size'] == 2
+
+    level = app.surveys.get().level_names[0]
+    for lang in ('en', 'de', 'xx'):
+        assert app_client.get(f'/survey/{level}?lang={lang}').status_code == 200
+    assert cache.stats()['size'] == 3
@@ -0,0 +1,64 @@
+"""Result record layout and the group commit of the results log."""
+import os
+
+import pytest
+
+import results_store
+
+
+@pytest.fixture
+def log(tmp_path, monkeypatch):
+    path = str(tmp_path / 'results.log')
+    monkeypatch.setattr(results_store, 'RESULTS_PATH', path)
+    monkeypatch.setattr(results_store, '_buffer', [])
+    monkeypatch.setattr(results_store, '_listeners', [])
+    monkeypatch.setattr(results_store, '_ensure_flusher', lambda: None)
+    return path
+
+
+@pytest.mark.parametrize('level_scores', [(1, 2, 3, 4, 5), (6, 0, 6), (), (255, 0, 0, 0, 1)])
+@pytest.mark.parametrize('lang', ['en', 'ar'])
+def test_record_round_trip(level_scores, lang):
+    data = results_store.pack_record(1700000000, 2 ** 64 - 1, level_scores, 3, lang, version=7)
+    assert len(data) == results_store.RECORD.size == 20
+    padding = (0,) * (results_store.LEVEL_SLOTS - len(level_scores))
+    assert results_store.unpack_record(data) == (1700000000, 2 ** 64 - 1, level_scores + padding, 3, lang, 7)
+
+
+def test_record_other_language_and_too_many_levels():
+    data = results_store.pack_record(1.9, 5, (1,), 0, 'fr')
+    assert results_store.unpack_record(data) == (1, 5, (1, 0, 0, 0, 0), 0, None, 0)
+    with pytest.raises(ValueError):
+        results_store.pack_record(0, 0, (0,) * (results_store.LEVEL_SLOTS + 1), 0, 'en')
+
+
+def test_flush_writes_batches_and_notifies_listeners(log):
+    committed = []
+    results_store.add_commit_listener(committed.extend)
+    for i in range(3):
+        results_store.record(i, (i, 0), 1, 'en', timestamp=1700000000 + i)
+    assert results_store.flush() == 3
+    assert results_store.flush() == 0
+    records = list(results_store.iter_records(log))
+    assert records == committed
+    assert [record[1] for record in records] == [0, 1, 2]
+    assert len(results_store.load(log)) == 3
+
+
+def test_failed_write_keeps_the_batch_for_the_next_flush(log, monkeypatch):
+    results_store.record(1, (1,), 0, 'en', timestamp=1700000000)
+    results_store.flush()
+    results_store.record(2, (2,), 0, 'ar', timestamp=1700000001)
+
+    def failing_fsync(fd):
+        raise OSError(28, 'No space left on device')
+
+    with monkeypatch.context() as patch:
+        patch.setattr(os, 'fsync', failing_fsync)
+        with pytest.raises(OSError):
+            results_store.flush()
+    # the partial batch was truncated away and is written again, once
+    assert [record[1] for record in results_store.iter_records(log)] == [1]
+    results_store.record(3, (3,), 0, 'en', timestamp=1700000002)
+    assert results_store.flush() == 2
+    assert [record[1] for record in results_store.iter_records(log)] == [1, 2, 3]
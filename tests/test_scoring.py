@@ -0,0 +1,58 @@
+"""Pins scoring and answer tokens to their original behaviour."""
+import pytest
+
+from answer_state import decode_state, encode_state
+from app import calculate_maturity, calculate_state_maturity, parse_answers, surveys
+from original_scoring import QUESTION_COUNTS, original_maturity, sample_answers
+
+@pytest.fixture(scope='module')
+def answer_strings():
+    return sample_answers(3000)
+
+
+def test_default_survey_matches_original_questions():
+    survey = surveys.get()
+    assert {level.name: len(level.questions) for level in survey.levels} == QUESTION_COUNTS
+    assert survey.thresholds == (6, 12, 19, 26)
+
+
+def test_calculate_maturity_matches_original(answer_strings):
+    for answers_str in answer_strings:
+        assert calculate_maturity(answers_str) == original_maturity(answers_str), answers_str
+
+
+@pytest.mark.parametrize('total', range(0, 37))
+def test_final_level_cutoffs(total):
+    keys = [key for key, _ in surveys.get().answer_keys]
+    answers_str = '&'.join(f"{key}={'C' if i < total // 2 else 'B' if i == total // 2 and total % 2 else 'A'}"
+                           for i, key in enumerate(keys))
+    final_level, level_scores = calculate_maturity(answers_str)
+    assert sum(level_scores.values()) == total
+    assert final_level == original_maturity(answers_str)[0]
+
+
+def test_packed_state_scores_like_answers(answer_strings):
+    survey = surveys.get()
+    for answers_str in answer_strings:
+        state = survey.pack(parse_answers(answers_str))
+        assert survey.pack(survey.unpack(state)) == state
+        assert calculate_state_maturity(state) == original_maturity(answers_str)
+
+
+@pytest.mark.parametrize('secret_key', [None, 'secret'])
+@pytest.mark.parametrize('version_id', [0, 1, 255])
+@pytest.mark.parametrize('state', [0, 1, 0b10_01_11, 2 ** 64 - 1])
+def test_state_token_round_trip(secret_key, version_id, state):
+    token = encode_state(state, secret_key, version_id)
+    assert decode_state(token, secret_key) == (version_id, state)
+
+
+def test_state_token_rejects_tampering():
+    token = encode_state(0b1011, 'secret', 3)
+    value, _, signature = token.rpartition('.')
+    assert decode_state(f'{value[:-1]}f.{signature}', 'secret') == (None, 0)
+    assert decode_state(token, 'other secret') == (None, 0)
+    assert decode_state(token.rpartition('.')[0], 'secret') == (None, 0)
+    assert encode_state(0b1011) == 'b'
+    for token in (None, '', 'zz', 'x-1', '1--1', '-1-1'):
+        assert decode_state(token) == (None, 0)
@@ -0,0 +1,106 @@
+"""Loading, hot reload and validation of survey definitions."""
+import json
+import os
+import shutil
+
+import pytest
+
+from survey_loader import SurveyRegistry
+
+SURVEYS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'surveys')
+
+
+@pytest.fixture
+def directory(tmp_path):
+    shutil.copy(os.path.join(SURVEYS, 'default.json'), tmp_path / 'default.json')
+    return tmp_path
+
+
+def read(directory, name='default'):
+    with open(directory / f'{name}.json', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def write(directory, definition, name='default'):
+    path = directory / f'{name}.json'
+    old = os.stat(path).st_mtime_ns if path.exists() else 0
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(definition, f, ensure_ascii=False)
+    # make sure the change is seen even within the file system's timestamp resolution
+    os.utime(path, ns=(old + 10 ** 9, old + 10 ** 9))
+
+
+def registry(directory):
+    return SurveyRegistry(str(directory), poll_interval=0)
+
+
+def test_versions_are_served_by_name_and_id(directory):
+    definition = read(directory)
+    definition['id'] = 2
+    write(directory, definition, 'v2')
+    surveys = registry(directory)
+    assert surveys.names() == ['default', 'v2']
+    assert surveys.get().name == surveys.get('unknown').name == 'default'
+    assert surveys.by_id(2) is surveys.get('v2')
+    assert surveys.by_id(9) is None
+
+
+def test_reload_swaps_in_changed_text(directory):
+    surveys = registry(directory)
+    before = surveys.get()
+    definition = read(directory)
+    definition['levels'][0]['recommendation_en'] = 'Start small.'
+    write(directory, definition)
+    assert surveys.reload() == ['default']
+    after = surveys.get()
+    assert after.recommendations['Minimal']['en'] == 'Start small.'
+    assert after.fingerprint != before.fingerprint
+    assert surveys.reload() == []
+
+
+def test_broken_file_keeps_the_last_good_version(directory, capsys):
+    surveys = registry(directory)
+    good = surveys.get()
+    with open(directory / 'default.json', 'w') as f:
+        f.write('{"id": 0, "levels": [')
+    assert surveys.reload() == []
+    assert surveys.reload() == []
+    assert surveys.get() is good
+    assert capsys.readouterr().out.count('Error loading survey') == 1
+
+    # valid JSON that fails validation
+    with open(os.path.join(SURVEYS, 'default.json'), encoding='utf-8') as f:
+        definition = json.load(f)
+    definition['levels'][0]['questions'][0]['options'] = ['A. Yes']
+    write(directory, definition)
+    assert surveys.reload() == []
+    assert surveys.get() is good
+
+
+def test_layout_change_needs_a_new_id(directory):
+    surveys = registry(directory)
+    good = surveys.get()
+    definition = read(directory)
+    del definition['levels'][-1]
+    definition['thresholds'] = definition['thresholds'][:-1]
+    write(directory, definition)
+    assert surveys.reload() == []
+    assert surveys.get() is good
+
+    # also after a restart, through the compiled copy of the previous definition
+    with pytest.raises(ValueError):
+        registry(directory)
+
+    definition['id'] = 1
+    write(directory, definition)
+    assert surveys.reload() == ['default']
+    assert surveys.get().version_id == 1
+    assert len(surveys.get().levels) == len(good.levels) - 1
+
+
+def test_compiled_copy_is_reused(directory):
+    first = registry(directory).get()
+    assert os.listdir(directory / '.cache') == ['default.pickle']
+    second = registry(directory).get()
+    assert second is not first
+    assert (second.fingerprint, second.layout) == (first.fingerprint, first.layout)